@@ -40,6 +40,9 @@ setup(
         'django-siteprefs>=1.1.0',
         'requests',
     ],
+    extras_require={
+        'async': ['httpx'],
+    },
     setup_requires=[] + (['pytest-runner'] if 'test' in sys.argv else []),
 
     include_package_data=True,
@@ -1,19 +1,29 @@
 from django.contrib import admin
 
-from .models import InvitationCode, BlacklistedDomain, EmailConfirmation, RemoteRecord
+from .models import InvitationCode, BlacklistedDomain, EmailConfirmation, RemoteRecord, OutboxEmail, \
+    InvitationRedemption
+
+
+class InvitationRedemptionInline(admin.TabularInline):
+
+    model = InvitationRedemption
+    extra = 0
+    readonly_fields = ('time_created',)
+    raw_id_fields = ('acceptor',)
 
 
 @admin.register(InvitationCode)
 class InvitationCodeAdmin(admin.ModelAdmin):
 
-    list_display = ('code', 'time_created', 'time_accepted', 'expired')
+    list_display = ('code', 'time_created', 'time_accepted', 'uses', 'max_uses', 'expired')
     list_display_links = ('code',)
     search_fields = ('code', 'creator', 'acceptor')
     list_filter = ('time_accepted',)
     ordering = ('-time_created',)
     date_hierarchy = 'time_created'
-    readonly_fields = ('time_accepted',)
+    readonly_fields = ('time_accepted', 'uses')
     raw_id_fields = ('creator', 'acceptor')
+    inlines = (InvitationRedemptionInline,)
 
 
 @admin.register(EmailConfirmation)
@@ -50,3 +60,14 @@ class RemoteRecordAdmin(admin.ModelAdmin):
     date_hierarchy = 'time_created'
     readonly_fields = ('time_accepted',)
     raw_id_fields = ('user',)
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+
+    list_display = ('recipient', 'subject', 'time_created', 'time_dispatch', 'attempts', 'failed')
+    list_display_links = ('recipient',)
+    search_fields = ('recipient', 'subject')
+    list_filter = ('failed',)
+    ordering = ('-time_created',)
+    date_hierarchy = 'time_created'
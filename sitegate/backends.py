@@ -0,0 +1,116 @@
+from typing import Optional, List, Tuple
+
+from django import VERSION
+from django.conf import settings
+from django.contrib.auth import load_backend
+from django.contrib.auth.backends import ModelBackend
+from django.db.models import QuerySet
+from django.db.models.functions import Lower
+from django.http import HttpRequest
+
+from .utils import USER
+
+if False:  # pragma: nocover
+    from django.contrib.auth.models import User  # noqa
+
+
+DJANGO_POST32 = VERSION >= (3, 2)
+
+EMAIL_LOWER_INDEX_NAME = 'sitegate_user_email_lower_idx'
+"""Name of a functional index on Lower(email) for a user model.
+Added by sitegate migrations for the default user model."""
+
+
+def filter_users_by_email(email: str) -> QuerySet:
+    """Returns a queryset of users with the given e-mail (case-insensitive).
+
+    Lookup is made against Lower(email) so that a functional index
+    on that expression could be used (see EMAIL_LOWER_INDEX_NAME).
+
+    :param email:
+
+    """
+    manager = USER._default_manager
+    # QuerySet.alias() is available since Django 3.2.
+    add_expression = manager.alias if DJANGO_POST32 else manager.annotate
+
+    return add_expression(
+        sitegate_email=Lower(USER.get_email_field_name())
+    ).filter(sitegate_email=email.lower())
+
+
+def get_email_backend() -> Optional[Tuple['EmailOrUsernameBackend', str]]:
+    """Returns e-mail or username authentication backend object and its path
+    if it is configured in AUTHENTICATION_BACKENDS.
+
+    """
+    for backend_path in settings.AUTHENTICATION_BACKENDS:
+        backend = load_backend(backend_path)
+
+        if isinstance(backend, EmailOrUsernameBackend):
+            return backend, backend_path
+
+    return None
+
+
+class EmailOrUsernameBackend(ModelBackend):
+    """Authenticates users either by username or by e-mail.
+
+    A user is resolved with a single query (limited to two rows
+    to detect ambiguous e-mails) and the password is verified against that row.
+
+    To use it add 'sitegate.backends.EmailOrUsernameBackend' into AUTHENTICATION_BACKENDS
+    (put it first, so that other backends are consulted only if it fails).
+
+    """
+    def get_users(self, login: str) -> List['User']:
+        """Returns no more than two users matching the given login.
+
+        :param login: E-mail or username.
+
+        """
+        if '@' in login:
+            users = list(filter_users_by_email(login)[:2])
+
+            if users:
+                return users
+
+        # Usernames may also contain @, so we fall back to username lookup.
+        return list(USER._default_manager.filter(**{USER.USERNAME_FIELD: login})[:2])
+
+    def check_users(self, users: List['User'], password: str) -> Optional['User']:
+        """Returns a user if there is exactly one in the given list
+        and the password is correct for that user.
+
+        :param users:
+        :param password:
+
+        """
+        if len(users) != 1:
+            # Run the default password hasher once to reduce the timing
+            # difference between an existing and a nonexistent user.
+            USER().set_password(password)
+            return None
+
+        user = users[0]
+
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+
+        return None
+
+    def authenticate(
+            self,
+            request: Optional[HttpRequest],
+            username: str = None,
+            password: str = None,
+            **kwargs
+    ) -> Optional['User']:
+
+        if username is None:
+            username = kwargs.get(USER.USERNAME_FIELD)
+
+        if username is None or password is None:
+            return None
+
+        return self.check_users(self.get_users(username), password)
@@ -0,0 +1,169 @@
+import re
+from functools import lru_cache
+from typing import List
+from uuid import uuid4
+
+from django.utils.crypto import salted_hmac, constant_time_compare, get_random_string
+from django.utils.module_loading import import_string
+
+from .settings import CODE_FORMAT, CODE_FORMATS_LEGACY
+
+
+class CodeFormat:
+    """Base for codes formats (see ModelWithCode.generate_code()).
+
+    Allows cheap structural validation of codes sent by clients,
+    so that malformed codes are rejected without DB queries.
+
+    """
+    def generate(self) -> str:  # pragma: nocover
+        """Generates a new code."""
+        raise NotImplementedError
+
+    def normalize(self, code: str) -> str:
+        """Normalizes a code entered by a user (e.g. removes separators).
+
+        :param code:
+
+        """
+        return code.strip()
+
+    def check(self, code: str) -> bool:  # pragma: nocover
+        """Returns a flag indicating whether the given code is well-formed.
+        Must not query DB.
+
+        :param code:
+
+        """
+        raise NotImplementedError
+
+
+class UuidCodeFormat(CodeFormat):
+    """Random UUID4 hex string. The default format."""
+
+    re_code = re.compile('[0-9a-f]{32}')
+
+    def generate(self) -> str:
+        return uuid4().hex
+
+    def check(self, code: str) -> bool:
+        return bool(self.re_code.fullmatch(code))
+
+
+class ChecksumCodeFormat(CodeFormat):
+    """Random part followed by a truncated HMAC of it.
+
+    Uses Crockford's base32 alphabet (no ambiguous characters). Codes are case-insensitive
+    and could be grouped with dashes (e.g. `8ZK4-W1QH-D3ME-A7TX`) for readability.
+
+    Customize by subclassing, e.g.::
+
+        class ShortCodeFormat(ChecksumCodeFormat):
+
+            length = 8
+            checksum_length = 4
+
+    """
+    alphabet: str = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+
+    length: int = 16
+    """Random part length. 16 characters give 80 bits."""
+
+    checksum_length: int = 4
+    """Checksum length. 4 characters give 20 bits: one in a million of random codes passes."""
+
+    group: int = 4
+    """Characters in a dash separated group. 0 - do not group."""
+
+    salt: str = 'sitegate.codes'
+
+    def get_checksum(self, value: str) -> str:
+        """Returns a checksum for the given random part.
+
+        :param value:
+
+        """
+        alphabet = self.alphabet
+        digest = salted_hmac(self.salt, value).digest()
+        return ''.join(alphabet[byte % 32] for byte in digest[:self.checksum_length])
+
+    def generate(self) -> str:
+        value = get_random_string(self.length, self.alphabet)
+        code = value + self.get_checksum(value)
+        group = self.group
+
+        if group:
+            code = '-'.join(code[idx:idx + group] for idx in range(0, len(code), group))
+
+        return code
+
+    def normalize(self, code: str) -> str:
+        code = code.strip().upper().replace('-', '').replace(' ', '')
+        group = self.group
+
+        if group:
+            code = '-'.join(code[idx:idx + group] for idx in range(0, len(code), group))
+
+        return code
+
+    def check(self, code: str) -> bool:
+        value = code.replace('-', '')
+        length = self.length
+
+        if len(value) != length + self.checksum_length or value.strip(self.alphabet):
+            return False
+
+        if self.group and code != self.normalize(value):
+            return False
+
+        return constant_time_compare(value[length:], self.get_checksum(value[:length]))
+
+
+@lru_cache(maxsize=None)
+def _get_format(path: str) -> CodeFormat:
+    return import_string(path)()
+
+
+def get_code_format() -> CodeFormat:
+    """Returns a format object used to generate new codes (see SITEGATE_CODE_FORMAT setting)."""
+    return _get_format(CODE_FORMAT)
+
+
+def get_code_formats() -> List[CodeFormat]:
+    """Returns format objects for codes accepted: the current one
+    and legacy ones (see SITEGATE_CODE_FORMATS_LEGACY setting).
+
+    """
+    paths = dict.fromkeys([CODE_FORMAT, *CODE_FORMATS_LEGACY])
+    return [_get_format(path) for path in paths]
+
+
+def normalize_code(code: str) -> str:
+    """Normalizes a code entered by a user.
+
+    Each of accepted formats is tried in turn, and the first normalized code
+    passing the format check is returned, so that codes of legacy formats are kept intact.
+
+    :param code:
+
+    """
+    for code_format in get_code_formats():
+        normalized = code_format.normalize(code)
+
+        if code_format.check(normalized):
+            return normalized
+
+    return code.strip()
+
+
+def is_code_well_formed(code: str) -> bool:
+    """Returns a flag indicating whether the given code is well-formed
+    according to any of the accepted formats. Does not query DB.
+
+    :param code:
+
+    """
+    if not code or not isinstance(code, str):
+        return False
+
+    return any(code_format.check(code) for code_format in get_code_formats())
@@ -14,19 +14,24 @@ if False:  # pragma: nocover
 class FlowBuilder(DecoratorBuilder):
 
     def __init__(self, flow_cls: Type['FlowsBase'], args: tuple, kwargs: dict):
-        self.flow_cls = flow_cls
-        super(FlowBuilder, self).__init__(args, kwargs)
-
-    def handle(self, func: Callable, args_func: tuple, kwargs_func: dict, args_dec: tuple, kwargs_dec: dict):
-        kwargs_dec_ = dict(kwargs_dec)
-        flow_class = kwargs_dec_.pop('flow', None)
+        kwargs_dec = dict(kwargs)
+        flow_class = kwargs_dec.pop('flow', None)
 
         if flow_class is None:
-            flow_class = self.flow_cls
+            flow_class = flow_cls
+
+        self.flow_cls = flow_class
 
-        flow_obj = flow_class(**kwargs_dec_)
+        # Flow objects are stateless, so we construct one on decoration and reuse it.
+        self.flow = flow_class(**kwargs_dec)
 
-        return flow_obj.respond_for(func, args_func, kwargs_func)
+        super(FlowBuilder, self).__init__(args, kwargs)
+
+    def contribute(self, target: Callable, func: Callable):
+        target.sitegate_flows = [*getattr(func, 'sitegate_flows', []), self.flow]
+
+    def handle(self, func: Callable, args_func: tuple, kwargs_func: dict, args_dec: tuple, kwargs_dec: dict):
+        return self.flow.respond_for(func, args_func, kwargs_func)
 
 
 class RedirectBuilder(DecoratorBuilder):
@@ -3,3 +3,7 @@
 
 class SiteGateError(Exception):
     """Exception class for sitesignup application."""
+
+
+class RemoteUnavailable(SiteGateError):
+    """Remote service is considered unavailable (circuit breaker is open)."""
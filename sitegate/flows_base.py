@@ -1,13 +1,37 @@
+from copy import deepcopy
+from hashlib import md5
 from pathlib import PurePath
-from typing import Optional, Any, Type
+from types import SimpleNamespace
+from typing import Optional, Any, Type, Dict, Tuple, List, Union
 
-from django import forms, VERSION
+from django import forms
+from django.conf import settings
 from django.contrib.auth import authenticate, login
+from django.core.exceptions import NON_FIELD_ERRORS
 from django.forms import ModelForm
+from django.forms.utils import ErrorDict
 from django.http import HttpRequest, HttpResponse
+from django.utils.functional import cached_property, SimpleLazyObject
+from django.utils.translation import get_language
 from etc.toolbox import set_form_widgets_attrs
 
-DJANGO_POST4 = VERSION[0] >= 4
+from .throttling import Throttle, get_client_ip, get_subnet
+
+if False:  # pragma: nocover
+    from django.contrib.auth.models import User  # noqa
+
+_FORM_CLASSES: Dict[Tuple[Type['FlowsBase'], Type[ModelForm], str, tuple], Type[ModelForm]] = {}
+"""Flows forms classes prepared for rendering. Indexed by flow class, base form class, template and widget attrs."""
+
+
+class LazyForm(SimpleLazyObject):
+    """Flow form constructed on first access.
+    Flow object is available as `flow` attribute without form construction.
+
+    """
+    def __init__(self, flow: 'FlowsBase', request: HttpRequest):
+        super().__init__(lambda: flow.get_requested_form(request))
+        self.__dict__['flow'] = flow
 
 
 class FlowsBase:
@@ -31,6 +55,14 @@ class FlowsBase:
     form: Type[ModelForm] = None
     """Form to be rendered for this flow."""
 
+    cache_forms: bool = False
+    """Whether to cache rendered form HTML for anonymous GET requests."""
+
+    throttle: Union[bool, Dict[str, float], None] = None
+    """Throttling settings. See `Throttle`."""
+
+    throttle_defaults: Dict[str, float] = {}
+
     def __init__(self, **kwargs):
         if not getattr(self, 'form', False):
             raise NotImplementedError(f'Please define `form` attribute in your `{self.__class__.__name__}` class.')
@@ -56,6 +88,90 @@ class FlowsBase:
 
         return template_name
 
+    @cached_property
+    def template(self) -> str:
+        """Template path to render this flow form with."""
+        return self.get_template_name(self.flow_args.get('template', None))
+
+    @cached_property
+    def flow_key(self) -> str:
+        """Name of a form field used to identify this flow."""
+        return f'{self.flow_type}_flow'
+
+    def get_form_cache_key_parts(self) -> List[str]:
+        """Returns a list of strings identifying rendered form HTML for caching."""
+        widget_attrs = self.flow_args.get('widget_attrs', None) or {}
+
+        return [
+            self.__class__.__module__,
+            self.__class__.__qualname__,
+            self.form.__qualname__,
+            self.template,
+            *(
+                f"{attr}={getattr(value, '__qualname__', value)}"
+                for attr, value in sorted(widget_attrs.items())
+            ),
+        ]
+
+    @cached_property
+    def form_cache_key_base(self) -> str:
+        return md5('|'.join(self.get_form_cache_key_parts()).encode()).hexdigest()
+
+    def get_form_cache_key(self, request: HttpRequest) -> Optional[str]:
+        """Returns a key to cache rendered form HTML with.
+        Returns None if form for this request should not be cached.
+
+        :param request:
+
+        """
+        if request.method != 'GET':
+            return None
+
+        user = getattr(request, 'user', None)
+
+        if user is None or not user.is_anonymous:
+            return None
+
+        return f'sitegate_form_{self.form_cache_key_base}_{get_language()}_{int(bool(self.enabled))}'
+
+    def get_form_cls(self, template: str, widget_attrs: dict = None) -> Type[ModelForm]:
+        """Returns a form class (a heir of `form`) with a flow identifying field,
+        a template and widgets attributes set. Classes are created once and then reused.
+
+        :param template:
+        :param widget_attrs: HTML attributes for fields widgets.
+
+        """
+        form_base = self.form
+        widget_attrs = widget_attrs or {}
+        key = (self.__class__, form_base, template, tuple(sorted(widget_attrs.items())))
+        form_cls = _FORM_CLASSES.get(key)
+
+        if form_cls is None:
+            attrs = {
+                '__module__': form_base.__module__,
+                # Flow identifying field to differentiate among several possible forms.
+                self.flow_key: forms.CharField(required=True, initial=self.get_flow_name(), widget=forms.HiddenInput),
+                # Shadows renderer based property in Django 4+.
+                'template_name': PurePath(template).stem,
+            }
+            form_cls = type(form_base.__name__, (form_base,), attrs)
+
+            if widget_attrs:
+                flow_key = self.flow_key
+                # Fields inherited from the base form are copied to keep it intact.
+                fields = {
+                    name: deepcopy(field)
+                    for name, field in form_cls.base_fields.items()
+                    if name != flow_key
+                }
+                set_form_widgets_attrs(SimpleNamespace(fields=fields), widget_attrs)
+                form_cls.base_fields.update(fields)
+
+            _FORM_CLASSES[key] = form_cls
+
+        return form_cls
+
     def handle_form_valid(self, request: HttpRequest, form: ModelForm) -> Optional[HttpResponse]:
         raise NotImplementedError  # pragma:  nocover
 
@@ -63,17 +179,77 @@ class FlowsBase:
         """Returns a response for the given view & args."""
 
         request = args[0]
-        form = self.get_requested_form(request)
 
-        if form.is_valid():
-            result = self.handle_form_valid(request, form)
-            if result:
-                return result
+        if self.is_requested(request):
+            form = self.get_requested_form(request)
+            rejected = self.check_allowed(request, form)
+
+            if rejected:
+                # Reject without validation.
+                form.cleaned_data = {}
+                form._errors = ErrorDict({NON_FIELD_ERRORS: form.error_class([rejected], error_class='nonfield')})
+
+            elif form.is_valid():
+                result = self.handle_form_valid(request, form)
+                if result:
+                    return result
+
+            else:
+                self.handle_form_invalid(request, form)
+
+        else:
+            # Form is not submitted, so it is constructed only if accessed (e.g. rendered).
+            form = LazyForm(self, request)
 
         self.update_request(request, form)
 
         return view_function(*args, **kwargs)
 
+    def get_throttle(self, name: str) -> Optional[Throttle]:
+        """Returns a throttle configured with the given flow argument or attribute
+        (defaults are taken from `<name>_defaults` attribute). Returns None if disabled.
+
+        :param name: E.g. `throttle`.
+
+        """
+        throttle = self.get_arg_or_attr(name)
+
+        if not throttle:
+            return None
+
+        if throttle is True:
+            throttle = {}
+
+        return Throttle(f'{self.flow_type}_{name}', **{**getattr(self, f'{name}_defaults', {}), **throttle})
+
+    @cached_property
+    def throttler(self) -> Optional[Throttle]:
+        """Throttle configured with `throttle` flow argument or attribute."""
+        return self.get_throttle('throttle')
+
+    def get_throttle_values(self, request: HttpRequest, form: ModelForm) -> Dict[str, str]:
+        """Returns throttling scopes values for the given request.
+
+        .. note:: Raw form data should be used since the form is not validated yet.
+
+        """
+        ip = get_client_ip(request)
+
+        return {
+            'ip': ip,
+            'subnet': get_subnet(ip),
+        }
+
+    def check_allowed(self, request: HttpRequest, form: ModelForm) -> Optional[str]:
+        """Checks whether the submitted form is allowed to be validated and handled.
+        Returns a text to reject the form with or None if allowed.
+
+        """
+        return None
+
+    def handle_form_invalid(self, request: HttpRequest, form: ModelForm):
+        """Handles the submitted form if it is invalid."""
+
     def update_request(self, request: HttpRequest, form: ModelForm):
         """Updates Request object with flows forms."""
         forms_key = f'{self.flow_type}_forms'
@@ -113,6 +289,18 @@ class FlowsBase:
 
         return False
 
+    @staticmethod
+    def login_user(request: HttpRequest, user: 'User') -> bool:
+        """Helper method. Logs in the given user object (e.g. just created one)
+        without authentication, thus without password hashing.
+
+        """
+        if not user.is_active:
+            return False
+
+        login(request, user, backend=getattr(user, 'backend', None) or settings.AUTHENTICATION_BACKENDS[0])
+        return True
+
     def get_arg_or_attr(self, name: str, default: Any = None) -> Any:
         """Returns flow argument, as provided with sitegate decorators
            or attribute set as a flow class attribute or default."""
@@ -126,41 +314,29 @@ class FlowsBase:
         except AttributeError:
             return default
 
-    def get_requested_form(self, request: HttpRequest) -> ModelForm:
-        """Returns an instance of a form requested."""
-        flow_name = self.get_flow_name()
-        flow_key = f'{self.flow_type}_flow'
-        flow_enabled = self.enabled
-        form_data = None
+    def is_requested(self, request: HttpRequest) -> bool:
+        """Returns a flag indicating whether this flow form is submitted with the request."""
+        flow_key = self.flow_key
 
-        if (flow_enabled and
+        return bool(
+            self.enabled and
             request.method == 'POST' and
-            request.POST.get(flow_key, False) and
-            request.POST[flow_key] == flow_name):
-
-            form_data = request.POST
+            request.POST.get(flow_key, False) == self.get_flow_name()
+        )
 
-        template = self.get_template_name(self.flow_args.get('template', None))
+    def get_requested_form(self, request: HttpRequest) -> ModelForm:
+        """Returns an instance of a form requested."""
+        flow_enabled = self.enabled
 
         form = self.init_form(
-            form_data,
+            request.POST if self.is_requested(request) else None,
             widget_attrs=self.flow_args.get('widget_attrs', None),
-            template=template
+            template=self.template
         )
 
-        # Attach flow identifying field to differentiate among several possible forms.
-        form.fields[flow_key] = forms.CharField(required=True, initial=flow_name, widget=forms.HiddenInput)
         form.flow_enabled = flow_enabled
         form.flow_disabled_text = self.disabled_text
 
-        template_name = PurePath(template).stem
-
-        if DJANGO_POST4:
-            form.renderer.form_template_name = template_name
-
-        else:
-            form.template_name = template_name
-
         return form
 
     def init_form(self, form_data: dict, widget_attrs: dict = None, template: str = None) -> ModelForm:
@@ -171,13 +347,11 @@ class FlowsBase:
         :param template:
 
         """
-        form = self.form(data=form_data)
+        template = template or self.template
+        form = self.get_form_cls(template, widget_attrs)(data=form_data)
 
         form.template = template
         # Attach flow attribute to have access from flow forms (usually to call get_arg_or_attr())
         form.flow = self
 
-        if widget_attrs is not None:
-            set_form_widgets_attrs(form, widget_attrs)
-
         return form
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from ...models import BlacklistedDomain
+
+
+class Command(BaseCommand):
+
+    help = 'Exports blacklisted domains (one domain per line).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help='File path. Defaults to stdout.')
+        parser.add_argument(
+            '--all', action='store_true', default=False,
+            help='Export disabled domains as well.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        domains = BlacklistedDomain.iter_domains(enabled=None if options['all'] else True)
+
+        if path == '-':
+            for domain in domains:
+                self.stdout.write(domain)
+            return
+
+        with open(path, 'w', encoding='utf-8') as f:
+            for domain in domains:
+                f.write(f'{domain}\n')
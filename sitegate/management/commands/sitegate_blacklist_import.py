@@ -0,0 +1,33 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from ...models import BlacklistedDomain
+
+
+class Command(BaseCommand):
+
+    help = 'Imports blacklisted domains from a text or CSV file (one domain per line).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File path. Use "-" to read from stdin.')
+        parser.add_argument(
+            '--disable', action='store_true', default=False,
+            help='Mark imported domains as not blacklisted (disabled).')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of domains to write in one query.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        load = lambda lines: BlacklistedDomain.bulk_load(
+            lines, enabled=not options['disable'], batch_size=options['batch_size'])
+
+        if path == '-':
+            count = load(sys.stdin)
+
+        else:
+            with open(path, encoding='utf-8') as f:
+                count = load(f)
+
+        self.stdout.write(f'Domains processed: {count}')
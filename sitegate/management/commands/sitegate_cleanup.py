@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ...models import InvitationCode, EmailConfirmation, RemoteRecord
+
+MODELS = {
+    'invitations': InvitationCode,
+    'confirmations': EmailConfirmation,
+    'remotes': RemoteRecord,
+}
+
+
+class Command(BaseCommand):
+
+    help = (
+        'Removes stale records in batches: expired invitation codes without redemptions, expired activation codes, '
+        'remote records not linked to users.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'targets', nargs='*', metavar='target',
+            help=f"Records to cleanup: {', '.join(MODELS.keys())}. Defaults to all.")
+        parser.add_argument(
+            '--ago', type=int, default=None,
+            help='Days. Cleanup only records created this number of days ago.')
+        parser.add_argument(
+            '--ttl', type=int, default=None,
+            help='Days. Also remove not expired codes created this number of days ago (e.g. abandoned sign ups).')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of records to remove in one query.')
+        parser.add_argument(
+            '--pause', type=float, default=0,
+            help='Seconds to sleep between batches.')
+        parser.add_argument(
+            '--dry-run', action='store_true', default=False,
+            help='Do not remove anything, just output counts.')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        targets = options['targets'] or MODELS.keys()
+
+        for target in targets:
+            if target not in MODELS:
+                raise CommandError(f'Unknown target: {target}')
+
+        for target in targets:
+            count = MODELS[target].cleanup(
+                ago=options['ago'],
+                ttl=options['ttl'],
+                batch_size=options['batch_size'],
+                pause=options['pause'],
+                dry_run=dry_run,
+            )
+            self.stdout.write(f"{target}: {count}{' (dry run)' if dry_run else ''}")
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ...models import InvitationCode
+from ...utils import USER, get_username_field
+
+
+class Command(BaseCommand):
+
+    help = 'Creates invitation codes and outputs them (one code per line).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('creator', help='Username of a user to be set as a creator of codes.')
+        parser.add_argument('count', type=int, help='Number of codes to create.')
+        parser.add_argument(
+            '--max-uses', type=int, default=1,
+            help='Number of sign ups allowed with every code.')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of codes to write in one query.')
+
+    def handle(self, *args, **options):
+        creator = options['creator']
+
+        try:
+            creator = USER._default_manager.get(**{get_username_field(): creator})
+
+        except USER.DoesNotExist:
+            raise CommandError(f'User "{creator}" is not found.')
+
+        codes = InvitationCode.add_bulk(
+            creator, options['count'], max_uses=options['max_uses'], batch_size=options['batch_size'])
+
+        for code in codes:
+            self.stdout.write(code)
@@ -0,0 +1,51 @@
+from time import sleep
+
+from django.core.management.base import BaseCommand
+
+from ...models import OutboxEmail
+
+
+class Command(BaseCommand):
+
+    help = 'Sends e-mails from sitegate outbox in batches over one mail connection.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Number of e-mails to send over one mail connection.')
+        parser.add_argument(
+            '--max-attempts', type=int, default=5,
+            help='Number of sending attempts to mark an e-mail as failed after.')
+        parser.add_argument(
+            '--backoff', type=float, default=60,
+            help='Seconds. Initial delay before the next sending attempt. Doubled with every attempt.')
+        parser.add_argument(
+            '--loop', action='store_true', default=False,
+            help='Do not exit when outbox is drained, poll for new e-mails instead.')
+        parser.add_argument(
+            '--pause', type=float, default=5,
+            help='Seconds to sleep between outbox polls in loop mode.')
+
+    def handle(self, *args, **options):
+        loop = options['loop']
+        total_sent = 0
+        total_failed = 0
+
+        while True:
+            sent, failed = OutboxEmail.send_batch(
+                batch_size=options['batch_size'],
+                max_attempts=options['max_attempts'],
+                backoff=options['backoff'],
+            )
+            total_sent += sent
+            total_failed += failed
+
+            if sent or failed:
+                continue
+
+            if not loop:
+                break
+
+            sleep(options['pause'])
+
+        self.stdout.write(f'sent: {total_sent}, failed: {total_failed}')
@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def dedupe_remote_ids(apps, schema_editor):
+    # Unique constraint can't be added if there are duplicate (remote, remote_id) pairs.
+    # Remote auth always used the first of them, so the rest are removed.
+    model = apps.get_model('sitegate', 'RemoteRecord')
+
+    duplicates = model.objects.filter(
+        remote_id__isnull=False
+    ).order_by().values('remote', 'remote_id').annotate(id_min=Min('id'), count=Count('id')).filter(count__gt=1)
+
+    for duplicate in duplicates:
+        model.objects.filter(
+            remote=duplicate['remote'],
+            remote_id=duplicate['remote_id'],
+            id__gt=duplicate['id_min'],
+        ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('sitegate', '0002_remoterecord'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='remoterecord',
+            index=models.Index(fields=['user', 'remote'], name='sitegate_rr_user_remote_idx'),
+        ),
+        migrations.RunPython(dedupe_remote_ids, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='remoterecord',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(remote_id__isnull=False), fields=('remote', 'remote_id'),
+                name='sitegate_rr_remote_rid_uniq'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+from django import VERSION
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+INDEX_NAME = 'sitegate_user_email_lower_idx'
+
+
+def get_index_model(apps):
+    # Only the default user model is handled. See docs for custom models.
+    # Functional indexes are available since Django 3.2.
+    if settings.AUTH_USER_MODEL.lower() != 'auth.user' or VERSION < (3, 2):
+        return None
+
+    return apps.get_model('auth', 'User')
+
+
+def get_index():
+    return models.Index(Lower('email'), name=INDEX_NAME)
+
+
+def add_index(apps, schema_editor):
+    model = get_index_model(apps)
+
+    if model is not None:
+        schema_editor.add_index(model, get_index())
+
+
+def remove_index(apps, schema_editor):
+    model = get_index_model(apps)
+
+    if model is not None:
+        schema_editor.remove_index(model, get_index())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('sitegate', '0003_remoterecord_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_index, remove_index),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.1.13 on 2026-10-18 15:35
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sitegate', '0004_user_email_lower_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEmail',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipient', models.CharField(max_length=254, verbose_name='Recipient')),
+                ('subject', models.CharField(max_length=255, verbose_name='Subject')),
+                ('body', models.TextField(verbose_name='Body')),
+                ('time_created', models.DateTimeField(auto_now_add=True, verbose_name='Date created')),
+                ('time_dispatch', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Dispatch after')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Attempts')),
+                ('error', models.TextField(blank=True, default='', verbose_name='Last error')),
+                ('failed', models.BooleanField(default=False, help_text='Failed e-mails are not sent anymore.', verbose_name='Failed')),
+            ],
+            options={
+                'verbose_name': 'Outbox e-mail',
+                'verbose_name_plural': 'Outbox e-mails',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='outboxemail',
+            index=models.Index(fields=['failed', 'time_dispatch'], name='sitegate_outbox_due_idx'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def set_uses(apps, schema_editor):
+    # Codes accepted before are single-use ones.
+    apps.get_model('sitegate', 'InvitationCode').objects.filter(acceptor__isnull=False).update(uses=1)
+
+
+def add_redemptions(apps, schema_editor):
+    # Sign ups made before are recorded as redemptions, so that cleanup keeps them.
+    code_model = apps.get_model('sitegate', 'InvitationCode')
+    redemption_model = apps.get_model('sitegate', 'InvitationRedemption')
+
+    accepted = code_model.objects.filter(acceptor__isnull=False).order_by('id').values_list('code', 'acceptor_id')
+    batch = []
+
+    for code, acceptor_id in accepted.iterator():
+        batch.append(redemption_model(code_id=code, acceptor_id=acceptor_id))
+
+        if len(batch) >= 1000:
+            redemption_model.objects.bulk_create(batch)
+            batch = []
+
+    redemption_model.objects.bulk_create(batch)
+
+    # Creation time is set to the time a code was accepted.
+    redemption_model.objects.update(time_created=Coalesce(
+        Subquery(code_model.objects.filter(code=OuterRef('code_id')).values('time_accepted')[:1]),
+        F('time_created'),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('sitegate', '0005_outboxemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invitationcode',
+            name='max_uses',
+            field=models.PositiveIntegerField(default=1, help_text='Number of sign ups allowed with this code.', verbose_name='Max uses'),
+        ),
+        migrations.AddField(
+            model_name='invitationcode',
+            name='uses',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Uses'),
+        ),
+        migrations.RunPython(set_uses, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='InvitationRedemption',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('time_created', models.DateTimeField(auto_now_add=True, verbose_name='Date created')),
+                ('acceptor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='redemptions', to=settings.AUTH_USER_MODEL, verbose_name='Acceptor')),
+                ('code', models.ForeignKey(db_column='code', on_delete=django.db.models.deletion.CASCADE, related_name='redemptions', to='sitegate.invitationcode', to_field='code', verbose_name='Invitation code')),
+            ],
+            options={
+                'verbose_name': 'Invitation redemption',
+                'verbose_name_plural': 'Invitation redemptions',
+            },
+        ),
+        migrations.RunPython(add_redemptions, migrations.RunPython.noop),
+    ]
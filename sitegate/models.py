@@ -1,19 +1,42 @@
 from datetime import timedelta
-from typing import Optional
+from time import sleep
+from typing import Optional, FrozenSet, Iterable, Iterator, List, Union, Tuple
 from uuid import uuid4
 
+from django import VERSION
 from django.conf import settings
-from django.db import models, IntegrityError
+from django.core import signing
+from django.core.cache import cache, caches, DEFAULT_CACHE_ALIAS
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.mail import EmailMessage, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import models, IntegrityError, transaction, connection as db_connection
+from django.db.models.deletion import Collector
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.utils import timezone
+from django.utils.crypto import salted_hmac, constant_time_compare
 from django.utils.translation import gettext_lazy as _
 from etc.models import InheritedModel
 
+from .codes import get_code_format, is_code_well_formed
+from .settings import SIGNUP_VERIFY_EMAIL_TOKEN_TIMEOUT, BLACKLIST_INDEX
+
 if False:  # pragma: nocover
     from django.contrib.auth.models import User  # noqa
 
 
 USER_MODEL = getattr(settings, 'AUTH_USER_MODEL', 'auth.User')
 
+DJANGO_POST41 = VERSION >= (4, 1)
+
+TOKEN_SALT = 'sitegate.email_confirmation'
+"""Salt for stateless e-mail confirmation tokens."""
+
+CACHE_KEY_BLACKLIST_VERSION = 'sitegate_blacklist_version'
+"""Cache key holding blacklisted domains index version shared among processes."""
+
 
 class BlacklistedDomain(models.Model):
 
@@ -24,13 +47,158 @@ class BlacklistedDomain(models.Model):
         help_text=_('If enabled visitors won\'t be able to sign up with this domain name in e-mail.'),
         db_index=True, default=True)
 
+    _index: Optional[FrozenSet[str]] = None
+    """Process-local index of enabled blacklisted domains."""
+
+    _index_version: Optional[str] = None
+    """Version of the index as read from cache."""
+
     class Meta:
         verbose_name = _('Blacklisted domain')
         verbose_name_plural = _('Blacklisted domains')
 
     @classmethod
-    def is_blacklisted(cls, email: str) -> bool:
-        """Checks whether the given e-mail is blacklisted.
+    def invalidate_index(cls):
+        """Invalidates blacklisted domains index in all processes.
+
+        Called automatically on model instance save and delete.
+        Should be called manually after bulk operations (e.g. `bulk_create()`, `update()`)
+        since those do not emit signals.
+
+        The version is bumped on transaction commit, so that other processes
+        won't reload the index with uncommitted data under a new version.
+
+        """
+        def bump():
+            cls._index = None
+            cache.set(CACHE_KEY_BLACKLIST_VERSION, uuid4().hex, None)
+
+        transaction.on_commit(bump)
+
+    @staticmethod
+    def is_index_enabled() -> bool:
+        """Whether in-memory index is used (see SITEGATE_BLACKLIST_INDEX).
+
+        By default the index is used only if the default cache is shared among processes:
+        with process-local caches (e.g. LocMemCache) other processes won't get invalidations.
+
+        """
+        if BLACKLIST_INDEX is not None:
+            return BLACKLIST_INDEX
+
+        return not isinstance(caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache))
+
+    @classmethod
+    def get_index(cls) -> Optional[FrozenSet[str]]:
+        """Returns a set of enabled blacklisted domains loading it from DB if required.
+        Returns None if index is not available (no shared cache backend is configured).
+
+        """
+        if not cls.is_index_enabled():
+            return None
+
+        version = cache.get(CACHE_KEY_BLACKLIST_VERSION)
+
+        if version is None:
+            # Cache was just started or evicted the key. Mark a new version.
+            cache.add(CACHE_KEY_BLACKLIST_VERSION, uuid4().hex, None)
+            version = cache.get(CACHE_KEY_BLACKLIST_VERSION)
+
+            if version is None:
+                # E.g. DummyCache. Can't sync among processes, so no index.
+                return None
+
+        if cls._index is None or version != cls._index_version:
+            cls._index = frozenset(cls.objects.filter(enabled=True).values_list('domain', flat=True))
+            cls._index_version = version
+
+        return cls._index
+
+    @staticmethod
+    def normalize_domain(value: str) -> str:
+        """Normalizes domain name from a line of text or CSV.
+        Returns an empty string for lines to skip (empty or comments).
+
+        :param value: E.g.: '@Some.Domain.com, some comment'
+
+        """
+        value = value.split(',', 1)[0].strip().lower()
+
+        if value.startswith('#'):
+            return ''
+
+        return value.rpartition('@')[2].strip('.')
+
+    @classmethod
+    def bulk_load(cls, domains: Iterable[str], *, enabled: bool = True, batch_size: int = 1000) -> int:
+        """Loads (upserts) domains in batches. Returns a number of domains processed.
+
+        Domains are normalized (see `normalize_domain()`) and deduplicated,
+        existing domains get `enabled` flag updated.
+
+        :param domains: Iterable of domain names, e.g. a file object.
+        :param enabled: Whether to blacklist (enable) or not loaded domains.
+        :param batch_size: Number of domains to process in one query.
+
+        """
+        normalize = cls.normalize_domain
+        manager = cls.objects
+        count = 0
+
+        def flush(batch: set):
+            items = [cls(domain=domain, enabled=enabled) for domain in batch]
+
+            if DJANGO_POST41:
+                manager.bulk_create(
+                    items, update_conflicts=True, update_fields=['enabled'], unique_fields=['domain'])
+
+            else:
+                # Django 2.2 - 4.0: no upserts, but ignore_conflicts is available.
+                manager.filter(domain__in=batch).update(enabled=enabled)
+                manager.bulk_create(items, ignore_conflicts=True)
+
+        batch = set()
+
+        for domain in domains:
+            domain = normalize(domain)
+
+            if not domain or domain in batch:
+                continue
+
+            batch.add(domain)
+
+            if len(batch) >= batch_size:
+                flush(batch)
+                count += len(batch)
+                batch = set()
+
+        if batch:
+            flush(batch)
+            count += len(batch)
+
+        cls.invalidate_index()
+
+        return count
+
+    @classmethod
+    def iter_domains(cls, *, enabled: Optional[bool] = True, chunk_size: int = 2000) -> Iterator[str]:
+        """Streams domain names from DB ordered by name.
+
+        :param enabled: Filter by enabled flag. None - do not filter.
+        :param chunk_size: Number of rows to fetch from DB at a time.
+
+        """
+        domains = cls.objects.order_by('domain')
+
+        if enabled is not None:
+            domains = domains.filter(enabled=enabled)
+
+        yield from domains.values_list('domain', flat=True).iterator(chunk_size=chunk_size)
+
+    @classmethod
+    def lookup(cls, email: str) -> Union[bool, models.QuerySet]:
+        """Checks whether the given e-mail is blacklisted using in-memory index.
+        If index is not available, returns a queryset to check for existence instead.
 
         :param email:
 
@@ -42,12 +210,37 @@ class BlacklistedDomain(models.Model):
         for i in range(domain.count('.') - 1):
             sub_domains.append(sub_domains[i].split('.', 1)[-1])
 
-        return cls.objects.filter(enabled=True, domain__in=sub_domains).exists()
+        index = cls.get_index()
+
+        if index is None:
+            return cls.objects.filter(enabled=True, domain__in=sub_domains)
+
+        return not index.isdisjoint(sub_domains)
+
+    @classmethod
+    def is_blacklisted(cls, email: str) -> bool:
+        """Checks whether the given e-mail is blacklisted.
+
+        :param email:
+
+        """
+        result = cls.lookup(email)
+
+        if isinstance(result, bool):
+            return result
+
+        return result.exists()
 
     def __str__(self):
         return self.domain
 
 
+@receiver(post_save, sender=BlacklistedDomain)
+@receiver(post_delete, sender=BlacklistedDomain)
+def invalidate_blacklist_index(**kwargs):
+    BlacklistedDomain.invalidate_index()
+
+
 class ModelWithCode(models.Model):
 
     code = models.CharField('dummy', max_length=128, unique=True, editable=False)
@@ -77,18 +270,125 @@ class ModelWithCode(models.Model):
         else:
             super(ModelWithCode, self).save(force_insert, force_update, **kwargs)
 
+    @classmethod
+    def filter_valid(cls, code: str) -> models.QuerySet:
+        """Returns a queryset of valid (not expired) records with the given code.
+        Malformed codes give an empty queryset without DB queries.
+
+        :param code:
+
+        """
+        if not is_code_well_formed(code):
+            return cls.objects.none()
+
+        return cls.objects.filter(code=code, expired=False)
+
     @classmethod
     def is_valid(cls, code: str) -> bool:
 
+        if not is_code_well_formed(code):
+            return False
+
         try:
-            return cls.objects.get(code=code, expired=False)
+            return cls.filter_valid(code).get()
 
         except (cls.MultipleObjectsReturned, cls.DoesNotExist):
             return False
 
+    @staticmethod
+    def is_code_well_formed(code: str) -> bool:
+        """Returns a flag indicating whether the given code is structurally valid
+        (see SITEGATE_CODE_FORMAT). Does not query DB.
+
+        :param code:
+
+        """
+        return is_code_well_formed(code)
+
     @staticmethod
     def generate_code() -> str:
-        return str(uuid4()).replace('-', '')
+        return get_code_format().generate()
+
+    @classmethod
+    def get_stale_filter(cls, *, ago: int = None, ttl: int = None) -> models.Q:
+        """Returns a filter to select stale records.
+
+        :param ago: Days. Allows filtering for stale records created X days ago.
+
+        :param ttl: Days. Records created X days ago are also considered stale
+            even if not expired (e.g. activation codes never used).
+
+        """
+        stale = models.Q(expired=True)
+
+        if ttl:
+            stale |= models.Q(time_created__lte=timezone.now() - timedelta(days=int(ttl)))
+
+        if ago:
+            stale &= models.Q(time_created__lte=timezone.now() - timedelta(days=int(ago)))
+
+        return stale
+
+    @classmethod
+    def cleanup(
+            cls,
+            *,
+            ago: int = None,
+            ttl: int = None,
+            batch_size: int = 1000,
+            pause: float = 0,
+            dry_run: bool = False
+    ) -> int:
+        """Removes stale records (see `get_stale_filter()`) in batches.
+        Useful for periodic background cleaning. Returns a number of records removed.
+
+        :param ago: Days. Allows cleanup for stale records created X days ago.
+            Defaults to None (cleanup all stale).
+
+        :param ttl: Days. Also remove not expired records created X days ago.
+
+        :param batch_size: Number of records to remove in one query.
+
+        :param pause: Seconds to sleep between batches to lower DB load.
+
+        :param dry_run: Do not remove anything, just count records to be removed.
+
+        """
+        stale = cls.objects.filter(cls.get_stale_filter(ago=ago, ttl=ttl))
+
+        if dry_run:
+            return stale.count()
+
+        stale = stale.order_by('id')
+        # A single DELETE without collecting objects is possible
+        # when there are no signal receivers and no reverse relations to cascade.
+        fast_delete = Collector(using=stale.db).can_fast_delete(stale)
+        id_last = 0
+        count = 0
+
+        while True:
+            # Keyset pagination keeps each select on a short primary key range.
+            ids = list(stale.filter(id__gt=id_last).values_list('id', flat=True)[:batch_size])
+
+            if not ids:
+                break
+
+            batch = cls.objects.filter(id__in=ids)
+
+            if fast_delete:
+                count += batch._raw_delete(batch.db)
+
+            else:
+                # Collector looks up related objects to cascade. Stale filters exclude records
+                # with related data to keep (e.g. invitation redemptions), so those lookups are empty.
+                count += batch.delete()[0]
+
+            id_last = ids[-1]
+
+            if pause and len(ids) == batch_size:
+                sleep(pause)
+
+        return count
 
 
 class InvitationCode(InheritedModel, ModelWithCode):
@@ -100,6 +400,11 @@ class InvitationCode(InheritedModel, ModelWithCode):
         USER_MODEL, related_name='acceptors', verbose_name=_('Acceptor'), null=True, blank=True,
         editable=False, on_delete=models.CASCADE)
 
+    max_uses = models.PositiveIntegerField(
+        _('Max uses'), help_text=_('Number of sign ups allowed with this code.'), default=1)
+
+    uses = models.PositiveIntegerField(_('Uses'), default=0, editable=False)
+
     class Meta:
         verbose_name = _('Invitation code')
         verbose_name_plural = _('Invitation codes')
@@ -109,14 +414,98 @@ class InvitationCode(InheritedModel, ModelWithCode):
         expired = {'help_text': _('Visitors won\'t be able to sign up with an expired code.')}
 
     @classmethod
-    def add(cls, creator: 'User') -> 'InvitationCode':
-        new_code = cls(creator=creator)
+    def get_stale_filter(cls, *, ago: int = None, ttl: int = None) -> models.Q:
+        """Expired codes without redemptions are considered stale,
+        so that sign ups history of used codes is kept."""
+        return super().get_stale_filter(ago=ago, ttl=ttl) & models.Q(redemptions__isnull=True)
+
+    @classmethod
+    def add(cls, creator: 'User', *, max_uses: int = 1) -> 'InvitationCode':
+        new_code = cls(creator=creator, max_uses=max_uses)
         new_code.save(force_insert=True)
         return new_code
 
     @classmethod
-    def accept(cls, code: str, acceptor: 'User'):
-        return cls.objects.filter(code=code).update(acceptor=acceptor, expired=True, time_accepted=timezone.now())
+    def add_bulk(cls, creator: 'User', count: int, *, max_uses: int = 1, batch_size: int = 1000) -> List[str]:
+        """Creates a number of invitation codes in batches. Returns a list of created codes.
+
+        :param creator:
+        :param count: Number of codes to create.
+        :param max_uses: Number of sign ups allowed with every code.
+        :param batch_size: Number of codes to insert in one query.
+
+        """
+        generate = cls.generate_code
+        manager = cls.objects
+        created = []
+
+        while len(created) < count:
+            codes = [generate() for _ in range(min(batch_size, count - len(created)))]
+            time_started = timezone.now()
+
+            manager.bulk_create(
+                [cls(creator=creator, code=code, max_uses=max_uses) for code in codes], ignore_conflicts=True)
+
+            # Collided codes are silently skipped by DB (ignore_conflicts, Django 2.2+).
+            # Next iteration tops up.
+            created.extend(manager.filter(
+                code__in=codes, creator=creator, time_created__gte=time_started,
+            ).values_list('code', flat=True))
+
+        return created
+
+    @classmethod
+    def accept(cls, code: str, acceptor: 'User') -> int:
+        """Redeems the given code for the acceptor. Returns a number of redeemed codes (0 or 1).
+
+        Uses counter is incremented with a single conditional UPDATE, so a code
+        can't be redeemed more than `max_uses` times even concurrently.
+        The code expires on the last use. Acceptors are recorded in `InvitationRedemption`.
+
+        :param code:
+        :param acceptor:
+
+        """
+        if not is_code_well_formed(code):
+            return 0
+
+        with transaction.atomic():
+            accepted = cls.objects.filter(code=code, expired=False, uses__lt=models.F('max_uses')).update(
+                # Goes before `uses`: MySQL evaluates assignments left to right
+                # and would otherwise see the incremented value.
+                expired=models.Case(
+                    models.When(max_uses__lte=models.F('uses') + 1, then=models.Value(True)),
+                    default=models.Value(False),
+                ),
+                uses=models.F('uses') + 1,
+                acceptor=acceptor,
+                time_accepted=timezone.now(),
+            )
+
+            if accepted:
+                InvitationRedemption.objects.create(code_id=code, acceptor=acceptor)
+
+        return accepted
+
+
+class InvitationRedemption(models.Model):
+    """Records sign ups with invitation codes."""
+
+    code = models.ForeignKey(
+        InvitationCode, to_field='code', db_column='code', related_name='redemptions',
+        verbose_name=_('Invitation code'), on_delete=models.CASCADE)
+
+    acceptor = models.ForeignKey(
+        USER_MODEL, related_name='redemptions', verbose_name=_('Acceptor'), on_delete=models.CASCADE)
+
+    time_created = models.DateTimeField(_('Date created'), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _('Invitation redemption')
+        verbose_name_plural = _('Invitation redemptions')
+
+    def __str__(self):
+        return f'{self.code_id} {self.acceptor_id}'
 
 
 class EmailConfirmation(InheritedModel, ModelWithCode):
@@ -137,14 +526,100 @@ class EmailConfirmation(InheritedModel, ModelWithCode):
         new_code.save(force_insert=True)
         return new_code
 
+    @staticmethod
+    def get_user_state(user: 'User') -> str:
+        """Returns a hash of user state a stateless token is bound to.
+
+        The state includes `last_login` which is set on activation (or sign in)
+        and is never reset, so tokens can't be reused even if a user is deactivated later.
+
+        :param user:
+
+        """
+        email = getattr(user, user.get_email_field_name(), '') or ''
+        last_login = '' if user.last_login is None else user.last_login.replace(microsecond=0, tzinfo=None)
+
+        return salted_hmac(
+            TOKEN_SALT,
+            f'{user.pk}{user.is_active}{user.password}{email}{last_login}'
+        ).hexdigest()[:20]
+
+    @classmethod
+    def make_token(cls, user: 'User') -> str:
+        """Returns a stateless signed time-limited activation token for the given user.
+        Can be used instead of an activation code stored in DB (see `add()`).
+
+        :param user:
+
+        """
+        # Primary key is a string to support non-integer keys (e.g. UUID).
+        return signing.dumps([str(user.pk), cls.get_user_state(user)], salt=TOKEN_SALT)
+
+    @classmethod
+    def activate_token(cls, token: str, *, max_age: int = None) -> bool:
+        """Checks the given stateless token (see `make_token()`) and activates its user.
+        Returns a flag indicating success.
+
+        :param token:
+        :param max_age: Seconds. Token lifetime. Default: SIGNUP_VERIFY_EMAIL_TOKEN_TIMEOUT.
+
+        """
+        try:
+            user_id, state = signing.loads(
+                token, salt=TOKEN_SALT, max_age=max_age or SIGNUP_VERIFY_EMAIL_TOKEN_TIMEOUT)
+
+        except (signing.BadSignature, ValueError, TypeError):
+            return False
+
+        users = cls._meta.get_field('user').related_model._default_manager
+        user = users.filter(pk=user_id).first()
+
+        if user is None or str(user.pk) != str(user_id):
+            return False
+
+        if not constant_time_compare(state, cls.get_user_state(user)):
+            return False
+
+        # Conditional update, so concurrent activations are safe.
+        # Setting last_login changes user state for good, so the token becomes unusable.
+        return users.filter(
+            pk=user.pk, is_active=False, last_login=user.last_login
+        ).update(is_active=True, last_login=timezone.now()) == 1
+
+    @classmethod
+    def activate_code(cls, code: str) -> bool:
+        """Expires the given code and activates its user. Returns a flag indicating success.
+
+        Uses two statements within one transaction: the code is expired with a conditional UPDATE,
+        and only if it was not expired before, the user is activated with another UPDATE.
+        So concurrent activations with the same code are safe: only one succeeds.
+
+        :param code:
+
+        """
+        if not is_code_well_formed(code):
+            return False
+
+        with transaction.atomic():
+            expired = cls.objects.filter(code=code, expired=False).update(expired=True, time_accepted=timezone.now())
+
+            if expired != 1:
+                return False
+
+            cls._meta.get_field('user').related_model._default_manager.filter(
+                pk__in=cls.objects.filter(code=code).values('user_id')
+            ).update(is_active=True)
+
+        return True
+
     def activate(self):
         self.expired = True
         self.time_accepted = timezone.now()
-        self.save()
+        self.save(update_fields=['expired', 'time_accepted'])
 
         user = self.user
         user.is_active = True
-        user.save()
+        user.save(update_fields=['is_active'])
 
 
 class RemoteRecord(ModelWithCode):
@@ -164,6 +639,15 @@ class RemoteRecord(ModelWithCode):
     class Meta:
         verbose_name = _('Remote record')
         verbose_name_plural = _('Remotes records')
+        indexes = [
+            models.Index(fields=['user', 'remote'], name='sitegate_rr_user_remote_idx'),
+        ]
+        constraints = [
+            # Also serves as an index for (remote, remote_id) lookups.
+            models.UniqueConstraint(
+                fields=['remote', 'remote_id'], condition=models.Q(remote_id__isnull=False),
+                name='sitegate_rr_remote_rid_uniq'),
+        ]
 
     def __str__(self):
         return f'{self.remote} {self.code}'
@@ -178,20 +662,129 @@ class RemoteRecord(ModelWithCode):
         return record
 
     @classmethod
-    def cleanup(cls, *, ago: int = None):
-        """Removes remote records not linked to certain user.
-        Useful for periodic background cleaning.
+    def get_stale_filter(cls, *, ago: int = None, ttl: int = None) -> models.Q:
+        """Remote records not linked to certain user are considered stale."""
+        stale = models.Q(remote_id__isnull=True, user_id__isnull=True)
 
-        :param ago: Days. Allows cleanup for stale records created X days ago.
-            Defaults to None (cleanup all stale).
+        if ago:
+            stale &= models.Q(time_created__lte=timezone.now() - timedelta(days=int(ago)))
+
+        return stale
+
+
+class OutboxEmail(models.Model):
+    """E-mail scheduled to be sent by a worker (see `sitegate_outbox_send` command)."""
+
+    recipient = models.CharField(_('Recipient'), max_length=254)
+    subject = models.CharField(_('Subject'), max_length=255)
+    body = models.TextField(_('Body'))
+    time_created = models.DateTimeField(_('Date created'), auto_now_add=True)
+    time_dispatch = models.DateTimeField(_('Dispatch after'), default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(_('Attempts'), default=0)
+    error = models.TextField(_('Last error'), blank=True, default='')
+    failed = models.BooleanField(
+        _('Failed'), help_text=_('Failed e-mails are not sent anymore.'), default=False)
+
+    class Meta:
+        verbose_name = _('Outbox e-mail')
+        verbose_name_plural = _('Outbox e-mails')
+        indexes = [
+            models.Index(fields=['failed', 'time_dispatch'], name='sitegate_outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipient} {self.subject}'
+
+    @classmethod
+    def schedule(cls, *, recipient: str, subject: str, body: str):
+        """Schedules an e-mail to be added into outbox on current transaction commit.
+
+        :param recipient: E-mail address.
+        :param subject:
+        :param body:
 
         """
-        filter_kwargs = {
-            'remote_id__isnull': True,
-            'user_id__isnull': True,
-        }
+        transaction.on_commit(lambda: cls.objects.create(recipient=recipient, subject=subject, body=body))
 
-        if ago:
-            filter_kwargs['time_created__lte'] = timezone.now() - timedelta(days=int(ago))
+    def register_failure(self, error: Exception, *, max_attempts: int, backoff: float):
+        """Registers a failed sending attempt postponing the next one exponentially.
+
+        :param error:
+        :param max_attempts: Attempts number to mark an e-mail as failed after.
+        :param backoff: Seconds. Initial delay before the next attempt.
+
+        """
+        self.attempts += 1
+        self.error = f'{error}'
+        self.failed = self.attempts >= max_attempts
+        self.time_dispatch = timezone.now() + timedelta(seconds=backoff * 2 ** (self.attempts - 1))
+
+    @classmethod
+    def send_batch(
+            cls,
+            *,
+            batch_size: int = 100,
+            max_attempts: int = 5,
+            backoff: float = 60,
+            connection: BaseEmailBackend = None
+    ) -> Tuple[int, int]:
+        """Sends a batch of due e-mails over one mail connection.
+        Sent e-mails are removed from outbox. Returns (sent, failed) counts.
+
+        Due e-mails are locked skipping already locked ones (if supported by DB),
+        so several workers can run simultaneously.
+
+        :param batch_size: Number of e-mails to send.
+        :param max_attempts: Attempts number to mark an e-mail as failed after.
+        :param backoff: Seconds. Initial delay before the next attempt.
+        :param connection: Mail backend object. If not set, default one is used.
+
+        """
+        due = cls.objects.filter(failed=False, time_dispatch__lte=timezone.now()).order_by('id')
+
+        if db_connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+
+        with transaction.atomic():
+
+            emails = list(due[:batch_size])
+
+            if not emails:
+                return 0, 0
+
+            connection = connection or get_connection()
+            sent = []
+            failed = []
+
+            try:
+                connection.open()
+                error = None
+
+            except Exception as e:
+                error = e
+
+            for email in emails:
+
+                if error is None:
+                    try:
+                        connection.send_messages([
+                            EmailMessage(email.subject, email.body, settings.DEFAULT_FROM_EMAIL, [email.recipient])
+                        ])
+                        sent.append(email.id)
+                        continue
+
+                    except Exception as e:
+                        email.register_failure(e, max_attempts=max_attempts, backoff=backoff)
+
+                else:
+                    email.register_failure(error, max_attempts=max_attempts, backoff=backoff)
+
+                failed.append(email)
+
+            connection.close()
+
+            cls.objects.filter(id__in=sent).delete()
+            # Single UPDATE for all failed (bulk_update is available since Django 2.2, the minimum supported).
+            cls.objects.bulk_update(failed, ['attempts', 'error', 'failed', 'time_dispatch'])
 
-        cls.objects.filter(**filter_kwargs).delete()
+        return len(sent), len(failed)
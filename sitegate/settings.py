@@ -8,9 +8,18 @@ if False:  # pragma: nocover
 SIGNIN_ENABLED = getattr(settings, 'SITEGATE_SIGNIN_ENABLED', True)
 SIGNIN_DISABLED_TEXT = getattr(settings, 'SITEGATE_SIGNIN_DISABLED_TEXT', _('Sign in is disabled.'))
 
+SIGNIN_THROTTLE = getattr(settings, 'SITEGATE_SIGNIN_THROTTLE', None)
+SIGNIN_THROTTLED_TEXT = getattr(
+    settings, 'SITEGATE_SIGNIN_THROTTLED_TEXT', _('Too many sign in attempts. Please try again later.'))
+
 SIGNUP_ENABLED = getattr(settings, 'SITEGATE_SIGNUP_ENABLED', True)
 SIGNUP_DISABLED_TEXT = getattr(settings, 'SITEGATE_SIGNUP_DISABLED_TEXT', _('Sign up is disabled.'))
 
+SIGNUP_THROTTLE = getattr(settings, 'SITEGATE_SIGNUP_THROTTLE', None)
+SIGNUP_THROTTLE_SUCCESS = getattr(settings, 'SITEGATE_SIGNUP_THROTTLE_SUCCESS', None)
+SIGNUP_THROTTLED_TEXT = getattr(
+    settings, 'SITEGATE_SIGNUP_THROTTLED_TEXT', _('Too many sign up attempts. Please try again later.'))
+
 SIGNUP_VERIFY_EMAIL_NOTICE = getattr(
     settings, 'SITEGATE_SIGNUP_VERIFY_EMAIL_NOTICE',
     _('Congratulations! You\'re almost done with the registration. Please check your mailbox '
@@ -28,10 +37,29 @@ SIGNUP_VERIFY_EMAIL_ERROR_TEXT = getattr(
     settings, 'SITEGATE_SIGNUP_VERIFY_EMAIL_ERROR_TEXT',
     _('Unable to verify an e-mail. User account was not activated.'))
 
+# Whether to use stateless signed tokens instead of activation codes stored in DB.
+SIGNUP_VERIFY_EMAIL_STATELESS = getattr(settings, 'SITEGATE_SIGNUP_VERIFY_EMAIL_STATELESS', False)
+
+# Seconds. Stateless token lifetime.
+SIGNUP_VERIFY_EMAIL_TOKEN_TIMEOUT = getattr(settings, 'SITEGATE_SIGNUP_VERIFY_EMAIL_TOKEN_TIMEOUT', 3 * 24 * 3600)
+
 SIGNUP_VERIFY_EMAIL_VIEW_NAME = getattr(settings, 'SITEGATE_SIGNUP_VERIFY_EMAIL_VIEW_NAME', 'verify_email')
 
+# Whether to keep blacklisted domains in memory index synchronized using cache.
+# None - only if the default cache is shared among processes (not LocMemCache or DummyCache).
+BLACKLIST_INDEX = getattr(settings, 'SITEGATE_BLACKLIST_INDEX', None)
+
+# Dotted path to a class used to generate invitation and activation codes (see sitegate.codes).
+CODE_FORMAT = getattr(settings, 'SITEGATE_CODE_FORMAT', 'sitegate.codes.UuidCodeFormat')
+
+# Dotted paths to classes of formats still accepted for codes issued before CODE_FORMAT switch.
+CODE_FORMATS_LEGACY = getattr(settings, 'SITEGATE_CODE_FORMATS_LEGACY', ['sitegate.codes.UuidCodeFormat'])
+
 USE_SITEMESSAGE = getattr(settings, 'SITEGATE_USE_SITEMESSAGE', 'sitemessage' in settings.INSTALLED_APPS)
 
+# Whether to send verification e-mails using built-in outbox (see sitegate_outbox_send command).
+USE_OUTBOX = getattr(settings, 'SITEGATE_USE_OUTBOX', False)
+
 USE_SITEPREFS = getattr(settings, 'SITEGATE_USE_SITEPREFS', 'siteprefs' in settings.INSTALLED_APPS)
 
 # Module name to search sitegate preferences in.
@@ -9,6 +9,9 @@ providing_args=['signup_result', 'flow', 'request']
 
 sig_user_signup_fail = django.dispatch.Signal()
 """Emitted when user sign up fails.
-providing_args=['signup_result', 'flow', 'request']
+providing_args=['signup_result', 'flow', 'request', 'reason']
+
+reason: `add_user` - user was not added, `throttled` - too many sign up attempts,
+`throttled_success` - too many successful sign ups.
 
 """
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Optional, List, Union, Dict
 
 from django.contrib.auth import login
 from django.forms import ModelForm
@@ -6,7 +6,7 @@ from django.http import HttpRequest, HttpResponse
 from django.shortcuts import redirect
 
 from ..flows_base import FlowsBase
-from ..settings import SIGNIN_ENABLED, SIGNIN_DISABLED_TEXT
+from ..settings import SIGNIN_ENABLED, SIGNIN_DISABLED_TEXT, SIGNIN_THROTTLE, SIGNIN_THROTTLED_TEXT
 from ..utils import get_registered_remotes
 
 
@@ -17,11 +17,53 @@ class SigninFlow(FlowsBase):
     enabled: bool = SIGNIN_ENABLED
     disabled_text: str = SIGNIN_DISABLED_TEXT
 
+    throttle: Union[bool, Dict[str, float], None] = SIGNIN_THROTTLE
+    """Failed sign in attempts throttling settings, e.g. {'window': 300, 'ip': 20, 'subnet': 100, 'username': 5}.
+    True to use defaults (see `throttle_defaults`). False or None to disable.
+
+    """
+
+    throttle_defaults: Dict[str, float] = {'window': 300, 'ip': 20, 'subnet': 100, 'username': 5}
+
+    def get_throttle_values(self, request: HttpRequest, form: ModelForm) -> Dict[str, str]:
+        values = super().get_throttle_values(request, form)
+        values['username'] = f"{form.data.get(form.add_prefix('username'), '')}".strip().lower()
+        return values
+
+    def check_allowed(self, request: HttpRequest, form: ModelForm) -> Optional[str]:
+        throttler = self.throttler
+
+        if throttler and throttler.is_exceeded(self.get_throttle_values(request, form)):
+            return f'{SIGNIN_THROTTLED_TEXT}'
+
+        return None
+
+    def handle_form_invalid(self, request: HttpRequest, form: ModelForm):
+        throttler = self.throttler
+
+        if throttler:
+            throttler.register(self.get_throttle_values(request, form))
+
     def get_requested_form(self, request: HttpRequest) -> ModelForm:
         form = super().get_requested_form(request)
-        form.remotes = get_registered_remotes().values()
+        form.remotes = [remote for remote in get_registered_remotes().values() if remote.available]
         return form
 
+    def get_form_cache_key(self, request: HttpRequest) -> Optional[str]:
+        key = super().get_form_cache_key(request)
+
+        if key:
+            # Cached HTML depends on remotes availability.
+            unavailable = [alias for alias, remote in get_registered_remotes().items() if not remote.available]
+
+            if unavailable:
+                key = f"{key}_{'_'.join(unavailable)}"
+
+        return key
+
+    def get_form_cache_key_parts(self) -> List[str]:
+        return super().get_form_cache_key_parts() + list(get_registered_remotes().keys())
+
     def handle_form_valid(self, request: HttpRequest, form: ModelForm) -> Optional[HttpResponse]:
         login(request, form.get_user())
 
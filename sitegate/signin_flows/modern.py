@@ -3,6 +3,7 @@ from django.utils.translation import gettext_lazy as _
 
 from .base import SigninFlow
 from .classic import ClassicSigninForm
+from ..backends import filter_users_by_email, get_email_backend
 from ..utils import USER
 
 
@@ -12,20 +13,39 @@ class ModernSigninForm(ClassicSigninForm):
         super(ModernSigninForm, self).__init__(request, *args, **kwargs)
         self.fields['username'].label = '%s / %s' % (_('Username'), _('Email'))
 
+    def raise_ambiguous(self):
+        raise forms.ValidationError(
+            _('There is more than one user with this e-mail. Please use your username to log in.'))
+
     def clean(self):
         username = self.cleaned_data.get('username')
         password = self.cleaned_data.get('password')
 
-        if username and password and '@' in username:
+        if not (username and password):
+            return super(ModernSigninForm, self).clean()
+
+        email_backend = get_email_backend()
+
+        if email_backend:
+            # The backend resolves a user and verifies a password using a single query.
+            # authenticate() is still used so that other configured backends are consulted.
+            try:
+                return super(ModernSigninForm, self).clean()
+
+            except forms.ValidationError:
+                if '@' in username and len(email_backend[0].get_users(username)) > 1:
+                    self.raise_ambiguous()
+                raise
+
+        if '@' in username:
             # Let's first try an e-mail auth.
-            result = USER._default_manager.filter(email__iexact=username)
+            usernames = list(filter_users_by_email(username).values_list(USER.USERNAME_FIELD, flat=True)[:2])
 
-            if len(result) == 1:
-                self.cleaned_data['username'] = result[0].username
+            if len(usernames) == 1:
+                self.cleaned_data['username'] = usernames[0]
 
-            elif len(result) > 1:
-                raise forms.ValidationError(
-                    _('There is more than one user with this e-mail. Please use your username to log in.'))
+            elif len(usernames) > 1:
+                self.raise_ambiguous()
 
         return super(ModernSigninForm, self).clean()
 
@@ -1,8 +1,17 @@
+import asyncio
 import logging
-from typing import Optional, List, NamedTuple
+import warnings
+from random import uniform
+from threading import Lock
+from time import sleep, perf_counter
+from typing import Optional, List, NamedTuple, Set, Tuple
+from weakref import WeakKeyDictionary
 
 import requests
+from requests.adapters import HTTPAdapter
 from django.contrib.auth import login
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist
 from django.db import IntegrityError
 from django.db.transaction import atomic
 from django.http import HttpResponseRedirect, HttpResponse, HttpRequest
@@ -10,19 +19,51 @@ from django.middleware.csrf import get_token
 from django.shortcuts import redirect, render
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.crypto import get_random_string, salted_hmac, constant_time_compare
 from django.utils.functional import cached_property
 from etc.toolbox import get_site_url
 
+from .breaker import CircuitBreaker, RemoteStats
+from ...exceptions import RemoteUnavailable
 from ...signals import sig_user_signup_success, sig_user_signup_fail
-from ...utils import USER
+from ...utils import USER, get_registered_remotes
 
 if False:  # pragma: nocover
     from django.contrib.auth.models import User  # noqa
     from ...models import RemoteRecord
 
+try:
+    import httpx
+
+except ImportError:  # pragma: nocover
+    httpx = None
+
 LOG = logging.getLogger(__name__)
 
 
+class compat_classmethod:
+    """Decorator for instance methods which were classmethods before.
+
+    Allows calling such methods on a class (e.g. `cls._request_json(url)` from a custom remote
+    `_get_user_data()` classmethod): a registered remote object is used in that case.
+
+    """
+    def __init__(self, func):
+        self.func = func
+        self.__doc__ = func.__doc__
+
+    def __get__(self, instance, owner):
+
+        if instance is None:
+            warnings.warn(
+                f'Calling {owner.__name__}.{self.func.__name__}() on a class is deprecated. '
+                'Make the calling method an instance method.', DeprecationWarning, stacklevel=2)
+
+            instance = owner._get_compat_instance()
+
+        return self.func.__get__(instance, owner)
+
+
 class UserData(NamedTuple):
     """Basic user data fetched from a remote."""
 
@@ -41,44 +82,376 @@ class Remote:
     alias: str = ''
     title: str = ''
 
+    url_user_data: str = ''
+    """URL to get user data from. Used by default `_get_user_data()` and `_aget_user_data()`."""
+
+    http_defaults: dict = {
+        'pool_size': 10,  # Max connections kept alive.
+        'timeout_connect': 3,  # Seconds.
+        'timeout_read': 4,  # Seconds.
+        'retries': 2,  # Retries for failed requests.
+        'backoff': 0.3,  # Seconds. Base for exponential backoff between retries.
+        'deadline': 6,  # Seconds. Overall time limit for a request with all its retries.
+    }
+    """HTTP settings for requests to remote."""
+
+    stateless: bool = False
+    """Whether to use signed tickets instead of storing a record in DB on every auth start.
+    A record is written only when auth is finished and a user is linked."""
+
+    ticket_max_age: int = 600
+    """Seconds. Signed ticket lifetime."""
+
+    ticket_cookie: str = 'sitegate_rticket'
+    """Cookie name prefix to keep signed ticket nonce binding a ticket to a browser.
+    Remote alias is appended (see `ticket_cookie_name`), so that auths with different remotes do not interfere."""
+
+    username_suffixes: int = 9
+    """Number of numeric suffixes to try for a username of a new user
+    if requested username and emails are taken."""
+
     _auth_fail_prefix = 'Remote auth failed:'
 
-    def __init__(self, *, client_id: str):
+    _retry_statuses: Set[int] = {429, 500, 502, 503, 504}
+
+    def __init__(self, *, client_id: str, http: dict = None, breaker: dict = None, stateless: bool = None):
+        """
+        :param client_id:
+        :param http: HTTP settings overriding `http_defaults`.
+        :param breaker: Circuit breaker settings overriding `CircuitBreaker.defaults`.
+        :param stateless: Use signed tickets instead of records in DB on auth start. See `stateless`.
+
+        """
         self.client_id = client_id
 
+        if stateless is not None:
+            self.stateless = stateless
+
+        self.http = {}
+        self._session = None
+        self._session_lock = Lock()
+        self._async_clients = WeakKeyDictionary()
+        self.configure_http(**(http or {}))
+
+        self.stats = RemoteStats()
+        """Requests latency and errors statistics."""
+
+        self.breaker = CircuitBreaker(self.alias, **(breaker or {}))
+
     def __str__(self):
         return f'{self.alias}'
 
+    def configure_http(self, **settings):
+        """Updates HTTP settings (see `http_defaults`). Drops previous HTTP session.
+
+        :param settings:
+
+        """
+        self.http = {**self.http_defaults, **self.http, **settings}
+        self._session = None
+        self._async_clients = WeakKeyDictionary()
+
+    def configure_breaker(self, **settings):
+        """Updates circuit breaker settings (see `CircuitBreaker.defaults`).
+
+        :param settings:
+
+        """
+        self.breaker = CircuitBreaker(self.alias, **{**self.breaker.settings, **settings})
+
+    @property
+    def available(self) -> bool:
+        """Whether the remote is considered available (circuit breaker is not open)."""
+        return not self.breaker.is_open
+
+    @property
+    def session(self) -> requests.Session:
+        """Pooled HTTP session to send requests to remote. Created on first access."""
+        session = self._session
+
+        if session is None:
+            with self._session_lock:
+                session = self._session
+
+                if session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.http['pool_size'])
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._session = session
+
+        return session
+
     @classmethod
-    def _get_user_data(cls, request: HttpRequest, *, data: dict) -> UserData:
+    def _get_compat_instance(cls) -> 'Remote':
+        """Returns a remote object to be used for calls made on a class (see `compat_classmethod`)."""
+        remote = get_registered_remotes().get(cls.alias)
+
+        if not isinstance(remote, cls):
+            remote = cls(client_id='')
+
+        return remote
+
+    def _get_async_client(self) -> 'httpx.AsyncClient':
+        """Returns an asynchronous HTTP client with a connection pool.
+
+        A client is bound to an event loop, so one client is kept per remote per loop.
+
+        """
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+
+        if client is None or client.is_closed:
+            client = self._make_async_client()
+            self._async_clients[loop] = client
+
+        return client
+
+    def _make_async_client(self) -> 'httpx.AsyncClient':
+        """Creates a new asynchronous HTTP client."""
+        pool_size = self.http['pool_size']
+        return httpx.AsyncClient(limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size))
+
+    def _get_retry_delay(self, attempt: int) -> float:
+        """Returns a delay (seconds) before the next retry: exponential backoff with full jitter.
+
+        :param attempt: Zero-based number of failed attempt.
+
+        """
+        return uniform(0, self.http['backoff'] * (2 ** attempt))
+
+    def _can_retry(self, attempt: int, *, delay: float, deadline: float) -> bool:
+        """Whether a request could be retried: retries are not exhausted
+        and a next attempt could start before the deadline.
+
+        :param attempt: Zero-based number of failed attempt.
+        :param delay: Seconds. Delay before the next attempt.
+        :param deadline: perf_counter() value to finish all attempts by.
+
+        """
+        return attempt < self.http['retries'] and perf_counter() + delay < deadline
+
+    def _get_timeouts(self, deadline: float) -> Tuple[float, float]:
+        """Returns (connect, read) timeouts for a request attempt capped by time left before the deadline.
+
+        :param deadline: perf_counter() value to finish all attempts by.
+
+        """
+        http = self.http
+        left = max(deadline - perf_counter(), 0.001)
+        return min(http['timeout_connect'], left), min(http['timeout_read'], left)
+
+    @classmethod
+    def _get_user_data_headers(cls, data: dict) -> dict:
+        """Returns headers to get user data from `url_user_data` with.
+
+        :param data: auth data
+
+        """
+        return {}
+
+    @classmethod
+    def _parse_user_data(cls, user_data: dict) -> UserData:
+        """Constructs user data object from data received from `url_user_data`.
+
+        :param user_data:
+
+        """
+        raise NotImplementedError  # pragma: nocover
+
+    def _get_user_data(self, request: HttpRequest, *, data: dict) -> UserData:
         """Get user data from a remote.
 
         :param request:
         :param data: auth data
 
         """
-        raise NotImplementedError  # pragma: nocover
+        if not self.url_user_data:
+            raise NotImplementedError  # pragma: nocover
+
+        return self._parse_user_data(
+            self._request_json(self.url_user_data, headers=self._get_user_data_headers(data)))
+
+    async def _aget_user_data(self, request: HttpRequest, *, data: dict) -> UserData:
+        """Get user data from a remote. Asynchronous variant.
+
+        Remotes overriding only `_get_user_data()` get it run in a thread.
+
+        :param request:
+        :param data: auth data
+
+        """
+        if not self.url_user_data:
+            from asgiref.sync import sync_to_async
+            return await sync_to_async(self._get_user_data, thread_sensitive=False)(request, data=data)
+
+        return self._parse_user_data(
+            await self._arequest_json(self.url_user_data, headers=self._get_user_data_headers(data)))
+
+    @compat_classmethod
+    def _request_json(self, url: str, *, headers: dict = None) -> dict:
+        """Sends a request to get a json.
+        Fails fast with RemoteUnavailable if circuit breaker is open.
+
+        :param url:
+        :param headers:
+
+        """
+        self._breaker_check()
+        started = perf_counter()
+
+        try:
+            result = self._fetch_json(url, headers=headers)
+
+        except Exception as e:
+            self._breaker_register(started, error=True, failure=self._is_remote_failure(e))
+            raise
+
+        self._breaker_register(started)
+
+        return result
+
+    @compat_classmethod
+    async def _arequest_json(self, url: str, *, headers: dict = None) -> dict:
+        """Sends a request to get a json. Asynchronous variant.
+        Fails fast with RemoteUnavailable if circuit breaker is open.
+
+        :param url:
+        :param headers:
+
+        """
+        self._breaker_check()
+        started = perf_counter()
+
+        try:
+            result = await self._afetch_json(url, headers=headers)
+
+        except Exception as e:
+            self._breaker_register(started, error=True, failure=self._is_remote_failure(e))
+            raise
+
+        self._breaker_register(started)
+
+        return result
+
+    def _breaker_check(self):
+        try:
+            self.breaker.check()
+
+        except RemoteUnavailable:
+            self.stats.add_rejected()
+            raise
+
+    def _breaker_register(self, started: float, *, error: bool = False, failure: bool = False):
+        latency = perf_counter() - started
+        self.stats.add(latency, error=error)
+        self.breaker.register(latency, error=failure)
 
     @classmethod
-    def _request_json(cls, url: str, *, headers: dict = None) -> dict:
+    def _is_remote_failure(cls, exception: Exception) -> bool:
+        """Whether the given exception means remote malfunction and should be counted
+        by circuit breaker: connection errors, timeouts, server errors, too many requests.
+
+        Client errors (4xx, e.g. for bogus access tokens sent by a client) are not failures,
+        otherwise anyone could open the breaker.
+
+        :param exception:
+
+        """
+        failures = (requests.ConnectionError, requests.Timeout)
+
+        if httpx is not None:
+            failures += (httpx.TransportError, httpx.TimeoutException)
+
+        if isinstance(exception, failures):
+            return True
+
+        response = getattr(exception, 'response', None)
+        status = getattr(response, 'status_code', None)
+
+        if status is None:
+            return False
+
+        return status >= 500 or status in cls._retry_statuses
+
+    def _fetch_json(self, url: str, *, headers: dict = None) -> dict:
         """Sends a request to get a json.
+        Retries on connection errors, timeouts and server errors.
 
         :param url:
         :param headers:
 
         """
+        http = self.http
         headers = {
             **(headers or {}),
         }
+        retry_statuses = self._retry_statuses
+        deadline = perf_counter() + http['deadline']
 
-        response = requests.get(
-            url,
-            headers=headers,
-            timeout=4,
-        )
+        for attempt in range(http['retries'] + 1):
+            delay = self._get_retry_delay(attempt)
+
+            try:
+                response = self.session.get(url, headers=headers, timeout=self._get_timeouts(deadline))
+
+            except (requests.ConnectionError, requests.Timeout):
+                if not self._can_retry(attempt, delay=delay, deadline=deadline):
+                    raise
+
+            else:
+                if (
+                    response.status_code not in retry_statuses or
+                    not self._can_retry(attempt, delay=delay, deadline=deadline)
+                ):
+                    response.raise_for_status()
+                    return response.json()
 
-        response.raise_for_status()
-        return response.json()
+            sleep(delay)
+
+    async def _afetch_json(self, url: str, *, headers: dict = None) -> dict:
+        """Sends a request to get a json. Asynchronous variant.
+
+        Uses `httpx` if available, otherwise falls back to `_fetch_json()` run in a thread.
+
+        :param url:
+        :param headers:
+
+        """
+        if httpx is None:
+            from asgiref.sync import sync_to_async
+            return await sync_to_async(self._fetch_json, thread_sensitive=False)(url, headers=headers)
+
+        http = self.http
+        headers = {
+            **(headers or {}),
+        }
+        retry_statuses = self._retry_statuses
+        deadline = perf_counter() + http['deadline']
+
+        client = self._get_async_client()
+
+        for attempt in range(http['retries'] + 1):
+            delay = self._get_retry_delay(attempt)
+            timeout_connect, timeout_read = self._get_timeouts(deadline)
+
+            try:
+                response = await client.get(
+                    url, headers=headers, timeout=httpx.Timeout(timeout_read, connect=timeout_connect))
+
+            except (httpx.TransportError, httpx.TimeoutException):
+                if not self._can_retry(attempt, delay=delay, deadline=deadline):
+                    raise
+
+            else:
+                if (
+                    response.status_code not in retry_statuses or
+                    not self._can_retry(attempt, delay=delay, deadline=deadline)
+                ):
+                    response.raise_for_status()
+                    return response.json()
+
+            await asyncio.sleep(delay)
 
     @cached_property
     def url_auth_start(self) -> str:
@@ -107,6 +480,28 @@ class Remote:
         try:
             return self._get_user_data(request, data=data)
 
+        except RemoteUnavailable:
+            LOG.warning(f'{self._auth_fail_prefix} remote is unavailable.')
+            return None
+
+        except Exception as _:
+            LOG.exception(f'{self._auth_fail_prefix} unable get user data from remote.')
+            return None
+
+    async def aget_user_data(self, request: HttpRequest, *, data: dict) -> Optional[UserData]:
+        """Get user data from a remote. Asynchronous variant.
+
+        :param request:
+        :param data: auth data
+
+        """
+        try:
+            return await self._aget_user_data(request, data=data)
+
+        except RemoteUnavailable:
+            LOG.warning(f'{self._auth_fail_prefix} remote is unavailable.')
+            return None
+
         except Exception as _:
             LOG.exception(f'{self._auth_fail_prefix} unable get user data from remote.')
             return None
@@ -126,53 +521,84 @@ class Remote:
             # in case of many candidate we won't guess, but create a new user
             return candidates[0]
 
-        email_field = USER.get_email_field_name()
+        username, email = self.allocate_username(user_data) or ('', '')
 
-        def set_email(value: str):
-            setattr(user, email_field, value)
+        if not username:
+            # give up trying
+            LOG.error(
+                f'{self._auth_fail_prefix} unable to spawn a user '
+                f'for "{user_data.username}" with {user_data.emails}')
+            return None
 
         # too many or none candidates. let's create a new user
         user = USER(
-            username=user_data.username,
+            username=username,
             first_name=user_data.first_name,
             last_name=user_data.last_name,
         )
-        set_email(user_data.emails[0])
+        setattr(user, USER.get_email_field_name(), email)
         user.set_unusable_password()
 
-        def save() -> bool:
-            try:
+        try:
+            # savepoint not to break an outer transaction
+            with atomic():
                 user.save()
 
-            except IntegrityError:
-                # DB unique username
-                return False
-            return True
+        except IntegrityError:
+            # username was taken in between
+            LOG.error(f'{self._auth_fail_prefix} unable to save a user "{username}".')
+            return None
+
+        return user
+
+    def get_username_candidates(self, user_data: UserData) -> List[Tuple[str, str]]:
+        """Returns (username, email) pairs to create a user with in order of preference.
+
+        :param user_data:
+
+        """
+        username = user_data.username
+        emails = user_data.emails
+
+        # requested username, then emails names, then full emails
+        candidates = [(username, emails[0])]
+        candidates.extend((email.partition('@')[0], email) for email in emails)
+        candidates.extend((email, email) for email in emails)
+
+        # requested username with numeric suffixes
+        candidates.extend((f'{username}_{idx}', emails[0]) for idx in range(1, self.username_suffixes + 1))
+
+        return candidates
+
+    def allocate_username(self, user_data: UserData) -> Optional[Tuple[str, str]]:
+        """Returns the first (username, email) pair from candidates,
+        which username is not yet taken. Uses one query. Returns None if all taken.
+
+        :param user_data:
+
+        """
+        try:
+            max_length = USER._meta.get_field('username').max_length
+
+        except FieldDoesNotExist:  # pragma: nocover
+            max_length = None
+
+        candidates = {}
+
+        for username, email in self.get_username_candidates(user_data):
+
+            if not username or (max_length and len(username) > max_length):
+                continue
+
+            candidates.setdefault(username, email)
 
-        if not save():
-            # current username is already taken
-            # let's try getting those from emails
-            for email in user_data.emails:
-                user.username, _, _ = email.partition('@')
-                set_email(email)
-                if save():
-                    break
-
-            if not user.id:
-                # still not saved. let's try emails
-                for email in user_data.emails:
-                    user.username = email
-                    set_email(email)
-                    if save():
-                        break
-
-            if not user.id:
-                # give up trying
-                LOG.error(
-                    f'{self._auth_fail_prefix} unable to spawn a user '
-                    f'for "{user_data.username}" with {user_data.emails}')
-
-        return user if user.id else None
+        taken = set(USER.objects.filter(username__in=list(candidates)).values_list('username', flat=True))
+
+        for username, email in candidates.items():
+            if username not in taken:
+                return username, email
+
+        return None
 
     def get_code_from_data(self, data: dict) -> str:
         """Returns a our code (from RemoteRecord.code) from data
@@ -245,6 +671,63 @@ class Remote:
         }
         return render(request, 'sitegate/remotes/generic.html', context)
 
+    def _get_ticket_salt(self) -> str:
+        return f'sitegate.remote_ticket.{self.alias}'
+
+    @property
+    def ticket_cookie_name(self) -> str:
+        """Cookie name to keep signed ticket nonce for this remote."""
+        return f'{self.ticket_cookie}_{self.alias}'
+
+    def auth_start_signed(self, request: HttpRequest, *, user: Optional['User']) -> HttpResponseRedirect:
+        """Redirects to a remote service to start auth using a signed ticket
+        instead of a record in DB (see `stateless`).
+
+        Ticket is bound to the given user and to a browser using a nonce kept in a cookie.
+
+        :param request:
+        :param user: current authorized user
+
+        """
+        nonce = get_random_string(32)
+
+        ticket = signing.dumps(
+            # Primary key is a string to support non-integer keys (e.g. UUID).
+            [str(user.pk) if user else None, salted_hmac(self._get_ticket_salt(), nonce).hexdigest()],
+            salt=self._get_ticket_salt())
+
+        response = self.auth_start(request, ticket=ticket)
+        response.set_cookie(
+            self.ticket_cookie_name, nonce,
+            max_age=self.ticket_max_age, httponly=True, samesite='Lax', secure=request.is_secure())
+
+        return response
+
+    def check_ticket(self, request: HttpRequest, ticket: str) -> bool:
+        """Checks whether the given signed ticket (see `auth_start_signed()`) is valid
+        for the request: signature, lifetime, browser nonce, and user. No DB queries are made.
+
+        :param request:
+        :param ticket:
+
+        """
+        salt = self._get_ticket_salt()
+
+        try:
+            user_id, nonce_hash = signing.loads(ticket, salt=salt, max_age=self.ticket_max_age)
+
+        except (signing.BadSignature, ValueError, TypeError):
+            return False
+
+        nonce = request.COOKIES.get(self.ticket_cookie_name, '')
+
+        if not nonce or not constant_time_compare(nonce_hash, salted_hmac(salt, nonce).hexdigest()):
+            return False
+
+        request_user = request.user
+
+        return user_id == (None if request_user.is_anonymous else str(request_user.pk))
+
     def auth_start(self, request: HttpRequest, *, ticket: str) -> HttpResponseRedirect:
         """Redirects to a remote service to start auth.
 
@@ -0,0 +1,156 @@
+from bisect import bisect_left
+from threading import Lock
+from time import time
+from typing import List, Dict, Tuple
+
+from django.core.cache import cache
+
+from ...exceptions import RemoteUnavailable
+from ...utils import cache_incr
+
+
+class RemoteStats:
+    """Process-local latency histogram and error counters for a remote."""
+
+    buckets: List[float] = [0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+    """Latency histogram buckets upper bounds (seconds). The last implicit bucket is +Inf."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        """Resets all counters."""
+        with self._lock:
+            self.requests = 0
+            self.errors = 0
+            self.rejected = 0
+            self.latency_sum = 0.0
+            self.latency_counts = [0] * (len(self.buckets) + 1)
+
+    def add(self, latency: float, *, error: bool = False):
+        """Registers a request.
+
+        :param latency: Seconds.
+        :param error: Whether the request failed.
+
+        """
+        with self._lock:
+            self.requests += 1
+            self.errors += error
+            self.latency_sum += latency
+            self.latency_counts[bisect_left(self.buckets, latency)] += 1
+
+    def add_rejected(self):
+        """Registers a request rejected by circuit breaker."""
+        with self._lock:
+            self.rejected += 1
+
+    def get(self) -> dict:
+        """Returns counters snapshot."""
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'errors': self.errors,
+                'rejected': self.rejected,
+                'latency_sum': self.latency_sum,
+                'latency_histogram': dict(zip([*self.buckets, float('inf')], self.latency_counts)),
+            }
+
+
+class CircuitBreaker:
+    """Circuit breaker for requests to a remote. State is shared among processes using Django cache.
+
+    * Closed - requests are allowed. Failed and slow requests are counted within a time window,
+      and if their rate reaches a threshold the breaker opens.
+    * Open - requests are rejected (fail fast) for `open_for` seconds.
+    * Half-open - after `open_for` is elapsed a single probe request is allowed.
+      Breaker closes on probe success and opens again on its failure.
+
+    """
+    defaults: Dict[str, float] = {
+        'failure_rate': 0.5,  # Failed requests rate to open the breaker at.
+        'min_requests': 10,  # Minimum requests in a window to calculate failure rate.
+        'window': 60,  # Seconds. Counting window.
+        'latency': 5,  # Seconds. Requests slower than this are considered failed.
+        'open_for': 30,  # Seconds. Time to reject requests before probing.
+    }
+
+    def __init__(self, alias: str, **settings):
+        self.settings = {**self.defaults, **settings}
+
+        prefix = f'sitegate_rb_{alias}'
+        self.prefix = prefix
+        self.key_open = f'{prefix}_open'
+        self.key_tripped = f'{prefix}_tripped'
+        self.key_probe = f'{prefix}_probe'
+
+    def get_counter_keys(self, *, now: float = None) -> Tuple[str, str]:
+        """Returns keys of total and failed requests counters for the current window.
+
+        Both counters are keyed by the same window index, so failures
+        from a previous window are never compared to a fresh total.
+
+        :param now: Timestamp.
+
+        """
+        window_idx = int((now or time()) // self.settings['window'])
+        prefix = self.prefix
+        return f'{prefix}_total_{window_idx}', f'{prefix}_failed_{window_idx}'
+
+    @property
+    def is_open(self) -> bool:
+        """Whether requests are being rejected."""
+        return cache.get(self.key_open) is not None
+
+    def check(self):
+        """Checks whether a request is allowed. Raises RemoteUnavailable if not."""
+        values = cache.get_many([self.key_open, self.key_tripped])
+
+        if self.key_open in values:
+            raise RemoteUnavailable()
+
+        if self.key_tripped in values:
+            # Half-open. Only one probe is allowed.
+            if not cache.add(self.key_probe, 1, self.settings['open_for']):
+                raise RemoteUnavailable()
+
+    def register(self, latency: float, *, error: bool = False):
+        """Registers request result.
+
+        :param latency: Seconds.
+        :param error: Whether the request failed.
+
+        """
+        settings = self.settings
+        failed = error or latency > settings['latency']
+
+        if cache.get(self.key_tripped) is not None:
+            # Half-open probe result.
+            if failed:
+                self.open()
+            else:
+                cache.delete_many([self.key_tripped, self.key_probe, *self.get_counter_keys()])
+            return
+
+        key_total, key_failed = self.get_counter_keys()
+        window = settings['window']
+        total = cache_incr(key_total, window)
+
+        if not failed:
+            return
+
+        failures = cache_incr(key_failed, window)
+
+        if total >= settings['min_requests'] and failures / total >= settings['failure_rate']:
+            self.open()
+
+    def open(self):
+        """Opens the breaker: requests are rejected for `open_for` seconds, then probed."""
+        cache.set(self.key_open, 1, self.settings['open_for'])
+        cache.set(self.key_tripped, 1, None)
+        cache.delete_many([self.key_probe, *self.get_counter_keys()])
+
+    def reset(self):
+        """Closes the breaker and drops counters."""
+        cache.delete_many([self.key_open, self.key_tripped, self.key_probe, *self.get_counter_keys()])
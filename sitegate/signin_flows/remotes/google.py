@@ -30,13 +30,14 @@ class Google(Remote):
     alias: str = 'google'
     title: str = _('Google')
 
+    url_user_data: str = 'https://www.googleapis.com/oauth2/v1/userinfo?alt=json'
+
     @classmethod
-    def _get_user_data(cls, request: HttpRequest, *, data: dict) -> UserData:
+    def _get_user_data_headers(cls, data: dict) -> dict:
+        return {'Authorization': f"Bearer {data.get('access_token')}"}
 
-        user_data = cls._request_json(
-            'https://www.googleapis.com/oauth2/v1/userinfo?alt=json',
-            headers={'Authorization': f"Bearer {data.get('access_token')}"},
-        )
+    @classmethod
+    def _parse_user_data(cls, user_data: dict) -> UserData:
 
         email = user_data['email']
 
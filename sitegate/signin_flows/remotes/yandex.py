@@ -26,13 +26,14 @@ class Yandex(Remote):
     alias: str = 'yandex'
     title: str = _('Yandex')
 
+    url_user_data: str = 'https://login.yandex.ru/info?format=json'
+
     @classmethod
-    def _get_user_data(cls, request: HttpRequest, *, data: dict) -> UserData:
+    def _get_user_data_headers(cls, data: dict) -> dict:
+        return {'Authorization': f"OAuth {data.get('access_token')}"}
 
-        user_data = cls._request_json(
-            'https://login.yandex.ru/info?format=json',
-            headers={'Authorization': f"OAuth {data.get('access_token')}"},
-        )
+    @classmethod
+    def _parse_user_data(cls, user_data: dict) -> UserData:
 
         user_data = UserData(
             remote_id=user_data['id'],
@@ -1,12 +1,15 @@
-from typing import Optional
+from typing import Optional, Union, Dict
 
 from django.forms import ModelForm
 from django.http import HttpRequest, HttpResponse
 from django.shortcuts import redirect
+from django.utils.functional import cached_property
 
 from ..flows_base import FlowsBase
-from ..settings import SIGNUP_ENABLED, SIGNUP_DISABLED_TEXT
+from ..settings import SIGNUP_ENABLED, SIGNUP_DISABLED_TEXT, SIGNUP_THROTTLE, SIGNUP_THROTTLE_SUCCESS, \
+    SIGNUP_THROTTLED_TEXT
 from ..signals import sig_user_signup_success, sig_user_signup_fail
+from ..throttling import Throttle
 
 if False:  # pragma: nocover
     from django.contrib.auth.models import User  # noqa
@@ -21,6 +24,56 @@ class SignupFlow(FlowsBase):
     enabled: bool = SIGNUP_ENABLED
     disabled_text: str = SIGNUP_DISABLED_TEXT
 
+    throttle: Union[bool, Dict[str, float], None] = SIGNUP_THROTTLE
+    """Sign up attempts throttling settings, e.g. {'window': 3600, 'ip': 20, 'subnet': 100, 'domain': 0}.
+    True to use defaults (see `throttle_defaults`). False or None to disable.
+
+    """
+
+    throttle_defaults: Dict[str, float] = {'window': 3600, 'ip': 20, 'subnet': 100, 'domain': 0}
+
+    throttle_success: Union[bool, Dict[str, float], None] = SIGNUP_THROTTLE_SUCCESS
+    """Successful sign ups throttling settings, e.g. {'window': 86400, 'ip': 5, 'subnet': 20, 'domain': 0}.
+    True to use defaults (see `throttle_success_defaults`). False or None to disable.
+
+    """
+
+    throttle_success_defaults: Dict[str, float] = {'window': 86400, 'ip': 5, 'subnet': 20, 'domain': 0}
+
+    @cached_property
+    def throttler_success(self) -> Optional[Throttle]:
+        """Throttle configured with `throttle_success` flow argument or attribute."""
+        return self.get_throttle('throttle_success')
+
+    def get_throttle_values(self, request: HttpRequest, form: ModelForm) -> Dict[str, str]:
+        values = super().get_throttle_values(request, form)
+        values['domain'] = f"{form.data.get(form.add_prefix('email'), '')}".rpartition('@')[2].strip().lower()
+        return values
+
+    def check_allowed(self, request: HttpRequest, form: ModelForm) -> Optional[str]:
+        throttler = self.throttler
+        throttler_success = self.throttler_success
+
+        if not (throttler or throttler_success):
+            return None
+
+        values = self.get_throttle_values(request, form)
+        rejected = None
+
+        for reason, throttle in (('throttled', throttler), ('throttled_success', throttler_success)):
+
+            if throttle and throttle.is_exceeded(values):
+                sig_user_signup_fail.send(
+                    self, signup_result=None, flow=self.get_flow_name(), request=request, reason=reason)
+                rejected = f'{SIGNUP_THROTTLED_TEXT}'
+                break
+
+        if throttler:
+            # Rejected attempts are also counted to keep flooders off.
+            throttler.register(values)
+
+        return rejected
+
     def handle_form_valid(self, request: HttpRequest, form: ModelForm) -> Optional[HttpResponse]:
         flow_name = self.get_flow_name()
 
@@ -30,6 +83,11 @@ class SignupFlow(FlowsBase):
         signup_result = self.add_user(request, form)
 
         if signup_result:
+            throttler_success = self.throttler_success
+
+            if throttler_success:
+                throttler_success.register(self.get_throttle_values(request, form))
+
             sig_user_signup_success.send(self, signup_result=signup_result, flow=flow_name, request=request)
 
             if self.get_arg_or_attr('auto_signin'):
@@ -41,7 +99,8 @@ class SignupFlow(FlowsBase):
                 return redirect(redirect_to)
 
         else:
-            sig_user_signup_fail.send(self, signup_result=signup_result, flow=flow_name, request=request)
+            sig_user_signup_fail.send(
+                self, signup_result=signup_result, flow=flow_name, request=request, reason='add_user')
 
     def add_user(self, request: HttpRequest, form: ModelForm) -> 'User':
         """Adds (creates) user using form data."""
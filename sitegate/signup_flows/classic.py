@@ -1,17 +1,22 @@
+from typing import List, NamedTuple, Union, FrozenSet
+
 from django import forms
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.forms import UserCreationForm
+from django.core.exceptions import ValidationError
 from django.core.mail import send_mail
+from django.db.models import QuerySet, Value, IntegerField
+from django.db.models.query import EmptyQuerySet
 from django.forms import ModelForm
 from django.http import HttpRequest
 from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
 
 from .base import SignupFlow
-from ..models import BlacklistedDomain, EmailConfirmation
+from ..models import BlacklistedDomain, EmailConfirmation, OutboxEmail
 from ..settings import SIGNUP_VERIFY_EMAIL_BODY, SIGNUP_VERIFY_EMAIL_TITLE, SIGNUP_VERIFY_EMAIL_NOTICE, \
-    SIGNUP_VERIFY_EMAIL_VIEW_NAME, USE_SITEMESSAGE
+    SIGNUP_VERIFY_EMAIL_VIEW_NAME, SIGNUP_VERIFY_EMAIL_STATELESS, USE_SITEMESSAGE, USE_OUTBOX
 from ..utils import USER
 
 if False:  # pragma: nocover
@@ -21,6 +26,26 @@ if False:  # pragma: nocover
 USERNAME_FIELD = getattr(USER, 'USERNAME_FIELD', 'username')
 
 
+class ExistenceCheck(NamedTuple):
+    """Describes a check for records existence in DB performed on form validation."""
+
+    field: str
+    """Form field name to add an error to."""
+
+    queryset: Union[QuerySet, bool]
+    """Queryset to check for existence or already known existence result."""
+
+    error: str
+    """Error message."""
+
+    expected: bool = False
+    """Whether records are expected to exist."""
+
+    unique: bool = False
+    """Whether the check validates field uniqueness, so that model
+    unique validation for the field could be skipped."""
+
+
 class ClassicSignupForm(UserCreationForm):
 
     """Classic form tuned to support custom user model."""
@@ -34,21 +59,83 @@ class ClassicSignupForm(UserCreationForm):
         model = USER
         fields = (USERNAME_FIELD,)
 
+    _unique_checked: FrozenSet[str] = frozenset()
+    """Fields which uniqueness is validated by existence checks."""
+
     def __init__(self, *args, **kwargs):
         super(ClassicSignupForm, self).__init__(*args, **kwargs)
         if USERNAME_FIELD != 'username' and 'username' in self.fields:
             del self.fields['username']
 
     def clean_username(self):
-        username = self.cleaned_data['username']
+        # Uniqueness is validated by existence checks.
+        return self.cleaned_data['username']
 
-        try:
-            USER._default_manager.get(username=username)
+    def get_existence_checks(self) -> List[ExistenceCheck]:
+        """Returns checks against DB for cleaned data.
+        All of them are answered using one combined query (see `run_existence_checks()`).
+
+        """
+        checks = []
+        username = self.cleaned_data.get('username')
+
+        if username:
+            checks.append(ExistenceCheck(
+                field='username',
+                queryset=USER._default_manager.filter(username=username),
+                error=self.error_messages['duplicate_username'],
+                unique=True,
+            ))
+
+        return checks
+
+    def run_existence_checks(self):
+        """Runs existence checks and adds errors to the appropriate fields."""
 
-        except USER.DoesNotExist:
-            return username
+        checks = [check for check in self.get_existence_checks() if check.field not in self.errors]
+        self._unique_checked = frozenset(check.field for check in checks if check.unique)
+        queries = []
 
-        raise forms.ValidationError(self.error_messages['duplicate_username'])
+        for idx, check in enumerate(checks):
+            if isinstance(check.queryset, QuerySet) and not isinstance(check.queryset, EmptyQuerySet):
+                queries.append(
+                    check.queryset.order_by().annotate(
+                        sitegate_check=Value(idx, output_field=IntegerField())
+                    ).values_list('sitegate_check', flat=True))
+
+        found = set()
+
+        if queries:
+            found.update(queries[0].union(*queries[1:]))
+
+        for idx, check in enumerate(checks):
+            queryset = check.queryset
+
+            if isinstance(queryset, bool):
+                exists = queryset
+
+            else:
+                # Empty querysets (e.g. for malformed codes) are known to have no records.
+                exists = not isinstance(queryset, EmptyQuerySet) and idx in found
+
+            if exists != check.expected and check.field not in self.errors:
+                self.add_error(check.field, check.error)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        self.run_existence_checks()
+        return cleaned_data
+
+    def validate_unique(self):
+        # Uniqueness of checked fields is already validated by existence checks.
+        exclude = set(self._get_validation_exclusions())
+        exclude.update(self._unique_checked)
+
+        try:
+            self.instance.validate_unique(exclude=exclude)
+
+        except ValidationError as e:  # pragma: nocover
+            self._update_errors(e)
 
 
 class ClassicSignup(SignupFlow):
@@ -60,8 +147,7 @@ class ClassicSignup(SignupFlow):
         return form.save()
 
     def sign_in(self, request: HttpRequest, form: ModelForm, signup_result: 'User') -> bool:
-        form_data = form.cleaned_data
-        return self.login_generic(request, form_data['username'], form_data['password1'])
+        return self.login_user(request, signup_result)
 
 
 class SimpleClassicSignupForm(ClassicSignupForm):
@@ -97,16 +183,18 @@ class ClassicWithEmailSignupForm(ClassicSignupForm):
     def __init__(self, *args, **kwargs):
         super(ClassicWithEmailSignupForm, self).__init__(*args, **kwargs)
 
-    def clean_email(self):
-
-        email = self.cleaned_data['email']
+    def get_existence_checks(self) -> List[ExistenceCheck]:
+        checks = super().get_existence_checks()
+        email = self.cleaned_data.get('email')
 
-        if self.flow.get_arg_or_attr('validate_email_domain'):
+        if email and self.flow.get_arg_or_attr('validate_email_domain'):
+            checks.append(ExistenceCheck(
+                field='email',
+                queryset=BlacklistedDomain.lookup(email),
+                error=_('Sign Up with this email domain is not allowed.'),
+            ))
 
-            if BlacklistedDomain.is_blacklisted(email):
-                raise forms.ValidationError(_('Sign Up with this email domain is not allowed.'))
-
-        return email
+        return checks
 
 
 class ClassicWithEmailSignup(ClassicSignup):
@@ -117,6 +205,8 @@ class ClassicWithEmailSignup(ClassicSignup):
     form = ClassicWithEmailSignupForm
     validate_email_domain = True
     verify_email = False
+    verify_email_stateless = SIGNUP_VERIFY_EMAIL_STATELESS
+    """Whether to send stateless signed tokens instead of activation codes stored in DB."""
 
     def __init__(self, **kwargs):
         super(ClassicWithEmailSignup, self).__init__(**kwargs)
@@ -135,6 +225,11 @@ class ClassicWithEmailSignup(ClassicSignup):
                     message_cls = get_message_type_for_app('sitegate', 'email_plain')
                     schedule_messages(message_cls(subject, text), recipients('smtp', to))
 
+            elif USE_OUTBOX:
+
+                def schedule_email(text, to, subject):
+                    OutboxEmail.schedule(recipient=to.email, subject=subject, body=text)
+
             else:
 
                 def schedule_email(text, to, subject):
@@ -145,8 +240,14 @@ class ClassicWithEmailSignup(ClassicSignup):
     def send_email(self, request: HttpRequest, user: 'User'):
 
         if getattr(self, 'schedule_email', False):
-            code = EmailConfirmation.add(user)
-            url = request.build_absolute_uri(reverse(SIGNUP_VERIFY_EMAIL_VIEW_NAME, args=(code.code,)))
+
+            if self.get_arg_or_attr('verify_email_stateless'):
+                code = EmailConfirmation.make_token(user)
+
+            else:
+                code = EmailConfirmation.add(user).code
+
+            url = request.build_absolute_uri(reverse(SIGNUP_VERIFY_EMAIL_VIEW_NAME, args=(code,)))
 
             email_text = f'{SIGNUP_VERIFY_EMAIL_BODY}'
             self.schedule_email(email_text % {'url': url}, user, f'{SIGNUP_VERIFY_EMAIL_TITLE}')
@@ -156,7 +257,6 @@ class ClassicWithEmailSignup(ClassicSignup):
     def add_user(self, request: HttpRequest, form: ModelForm) -> 'User':
 
         user = super(form.__class__, form).save(commit=False)
-        user.set_password(form.cleaned_data['password1'])
         user.email = form.cleaned_data['email']
         user.save()
 
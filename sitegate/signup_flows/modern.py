@@ -1,9 +1,14 @@
+from typing import List
+
 from django import forms
+from django.db import transaction
 from django.forms import ModelForm
 from django.http import HttpRequest
 from django.utils.translation import gettext_lazy as _
 
-from .classic import SimpleClassicWithEmailSignup, SimpleClassicWithEmailSignupForm
+from .classic import SimpleClassicWithEmailSignup, SimpleClassicWithEmailSignupForm, ExistenceCheck
+from ..backends import filter_users_by_email
+from ..codes import normalize_code
 from ..models import InvitationCode
 from ..utils import USER
 
@@ -36,11 +41,22 @@ class ModernSignupForm(SimpleClassicWithEmailSignupForm):
         if 'username' in self.fields:
             del self.fields['username']
 
-    def clean_email(self):
-        email = super(ModernSignupForm, self).clean_email()
+    def get_existence_checks(self) -> List[ExistenceCheck]:
+        checks = super().get_existence_checks()
+        email = self.cleaned_data.get('email')
+
+        if email:
+            checks.append(ExistenceCheck(
+                field='email',
+                queryset=filter_users_by_email(email),
+                error=_('A user with that e-mail already exists.'),
+                unique=True,
+            ))
 
-        if USER._default_manager.filter(email__iexact=email):
-            raise forms.ValidationError(_('A user with that e-mail already exists.'))
+        return checks
+
+    def clean_email(self):
+        email = self.cleaned_data['email']
 
         if len(email) > USERNAME_MAX_LEN:
             raise forms.ValidationError(
@@ -58,20 +74,28 @@ class ModernSignup(SimpleClassicWithEmailSignup):
     form = ModernSignupForm
 
     def sign_in(self, request: HttpRequest, form: ModelForm, signup_result: 'User') -> bool:
-        form_data = form.cleaned_data
-        return self.login_generic(request, form_data['email'], form_data['password1'])
+        return self.login_user(request, signup_result)
 
-    def add_user(self, request: HttpRequest, form: ModelForm) -> 'User':
+    def save_user(self, request: HttpRequest, form: ModelForm) -> 'User':
+        """Saves a new user from form data without sending any e-mails.
+
+        :param request:
+        :param form:
 
+        """
         user = super(form.__class__, form).save(commit=False)
 
         if not hasattr(user, 'USERNAME_FIELD') or user.USERNAME_FIELD == 'username':
             user.username = form.cleaned_data['email']
 
         user.email = form.cleaned_data['email']
-        user.set_password(form.cleaned_data['password1'])
         user.save()
 
+        return user
+
+    def add_user(self, request: HttpRequest, form: ModelForm) -> 'User':
+
+        user = self.save_user(request, form)
         self.send_email(request, user)
 
         return user
@@ -88,12 +112,21 @@ class InvitationSignupForm(ModernSignupForm):
         self.fields = new_fields
 
     def clean_code(self):
-        code = self.cleaned_data['code']
+        return normalize_code(self.cleaned_data['code'])
 
-        if not InvitationCode.is_valid(code):
-            raise forms.ValidationError(_('This invitation code is invalid.'))
+    def get_existence_checks(self) -> List[ExistenceCheck]:
+        checks = super().get_existence_checks()
+        code = self.cleaned_data.get('code')
 
-        return code
+        if code:
+            checks.insert(0, ExistenceCheck(
+                field='code',
+                queryset=InvitationCode.filter_valid(code),
+                error=_('This invitation code is invalid.'),
+                expected=True,
+            ))
+
+        return checks
 
 
 class InvitationSignup(ModernSignup):
@@ -102,6 +135,16 @@ class InvitationSignup(ModernSignup):
     form = InvitationSignupForm
 
     def add_user(self, request, form):
-        user = super(InvitationSignup, self).add_user(request, form)
-        InvitationCode.accept(form.cleaned_data['code'], user)
+
+        with transaction.atomic():
+            user = self.save_user(request, form)
+
+            if not InvitationCode.accept(form.cleaned_data['code'], user):
+                # Code uses are exhausted concurrently.
+                transaction.set_rollback(True)
+                return None
+
+        # The code is redeemed, so that no e-mail is sent for a user rolled back.
+        self.send_email(request, user)
+
         return user
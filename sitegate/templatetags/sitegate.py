@@ -1,15 +1,21 @@
-from typing import Optional
+from typing import Optional, Dict
 
 from django import template
 from django.conf import settings
+from django.core.cache import cache
 from django.template import Context
-from django.template.base import Parser, Token
+from django.template.base import Parser, Token, Template
+from django.template.loaders.cached import Loader as CachedLoader
+from django.utils.safestring import mark_safe
 from etc.templatetags.etc_misc import include_
 
 from ..exceptions import SiteGateError
 
 register = template.Library()
 
+CSRF_PLACEHOLDER = '__sitegate_csrf_token__'
+"""Placeholder for CSRF token in cached forms HTML."""
+
 # register tag from etc so the user are not required to add etc in INSTALLED_APPS
 register.tag('sitegate_include', include_)
 
@@ -19,8 +25,39 @@ class sitegate_flow_formNode(template.Node):
 
     type: str = None
 
-    def __init__(self, flow_name: Optional[str]):
+    def __init__(self, flow_name: Optional[str], cached: bool = False):
         self.flow_name = flow_name
+        self.cached = cached
+        self.templates: Dict[str, Template] = {}
+
+    def get_template(self, context: Context, path: str) -> Template:
+        """Returns a compiled template for the given path.
+
+        Templates are cached within the node if templates engine uses cached loader,
+        otherwise within render context (to reload templates on changes).
+
+        :param context:
+        :param path:
+
+        """
+        templates = self.templates
+        compiled = templates.get(path)
+
+        if compiled is None:
+            render_context = context.render_context
+            compiled = render_context.get((self, path))
+
+            if compiled is None:
+                engine = context.template.engine
+                compiled = engine.get_template(path)
+
+                if any(isinstance(loader, CachedLoader) for loader in engine.template_loaders):
+                    templates[path] = compiled
+
+                else:
+                    render_context[(self, path)] = compiled
+
+        return compiled
 
     def render(self, context: Context) -> str:
         try:
@@ -45,13 +82,29 @@ class sitegate_flow_formNode(template.Node):
                     f'`sitegate_{self.type}_form` tag is used but the appropriate form is not found in context.')
             return ''
 
-        context.push()
-        context[f'{self.type}_form'] = flow_form
+        form_var = f'{self.type}_form'
+        cache_key = None
+        csrf_token = context.get('csrf_token')
+
+        if csrf_token and csrf_token != 'NOTPROVIDED':
+            flow = flow_form.flow
+
+            if self.cached or flow.get_arg_or_attr('cache_forms'):
+                cache_key = flow.get_form_cache_key(context['request'])
+
+        if cache_key is None:
+            with context.push({form_var: flow_form}):
+                return self.get_template(context, flow_form.template).render(context)
 
-        content = template.loader.get_template(
-            flow_form.template).render(context.flatten())
+        content = cache.get(cache_key)
 
-        return content
+        if content is None:
+            with context.push({form_var: flow_form, 'csrf_token': CSRF_PLACEHOLDER}):
+                content = f'{self.get_template(context, flow_form.template).render(context)}'
+
+            cache.set(cache_key, content)
+
+        return mark_safe(content.replace(CSRF_PLACEHOLDER, f'{csrf_token}'))
 
 
 def tag_builder(parser: Parser, token: Token, cls, flow_type):
@@ -59,6 +112,11 @@ def tag_builder(parser: Parser, token: Token, cls, flow_type):
     tokens = token.split_contents()
     tokens_num = len(tokens)
 
+    cached = tokens[-1] == 'cached'
+
+    if cached:
+        tokens_num -= 1
+
     if tokens_num == 1 or (tokens_num == 3 and tokens[1] == 'for'):
 
         flow_name = None
@@ -66,12 +124,12 @@ def tag_builder(parser: Parser, token: Token, cls, flow_type):
         if tokens_num == 3:
             flow_name = tokens[2]
 
-        return cls(flow_name)
+        return cls(flow_name, cached=cached)
 
     raise template.TemplateSyntaxError(
-        f'"sitegate_{flow_type}_form" tag requires zero or two arguments. '
+        f'"sitegate_{flow_type}_form" tag requires zero or two arguments and optional `cached` flag. '
         f'E.g. {{%% sitegate_{flow_type}_form %%}} or '
-        f'{{%% sitegate_{flow_type}_form for ClassicSignup %%}}.')
+        f'{{%% sitegate_{flow_type}_form for ClassicSignup cached %%}}.')
 
 
 @register.tag
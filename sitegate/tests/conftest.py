@@ -1,6 +1,18 @@
+import pytest
+from django.core.cache import cache
 from pytest_djangoapp import configure_djangoapp_plugin
 
 
 pytest_plugins = configure_djangoapp_plugin(
+    {
+        # Tests run in one process, so LocMemCache is fine for the index.
+        'SITEGATE_BLACKLIST_INDEX': True,
+    },
     admin_contrib=True,
 )
+
+
+@pytest.fixture(autouse=True)
+def cache_clear():
+    # Cache is used for shared state (e.g. remotes circuit breakers).
+    cache.clear()
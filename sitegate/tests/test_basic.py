@@ -1,5 +1,8 @@
+from datetime import timedelta
+
 import pytest
 from django.urls import reverse
+from django.utils import timezone
 
 from sitegate.models import EmailConfirmation, BlacklistedDomain
 from sitegate.signup_flows.base import SignupFlow
@@ -25,7 +28,74 @@ def test_verify_email(user, request_client, messages):
     assert len(messages) == 2
 
 
-def test_is_blacklisted():
+def test_activate_token(user, request_client, messages, db_queries):
+    user.is_active = False
+    user.save()
+    token = EmailConfirmation.make_token(user)
+
+    assert not EmailConfirmation.activate_token(f'{token}x')
+    assert not EmailConfirmation.activate_token(token, max_age=-1)
+
+    db_queries.clear()
+    request_client().get(reverse('verify_email', args=[token]))
+    assert 'successfully verified' in messages
+    # user select, user update
+    assert len(db_queries) == 2
+    assert not EmailConfirmation.objects.exists()
+
+    user.refresh_from_db()
+    assert user.is_active
+
+    # one-time
+    assert not EmailConfirmation.activate_token(token)
+
+    # deactivated (e.g. banned) user can't be activated with the old token
+    user.is_active = False
+    user.save()
+    assert not EmailConfirmation.activate_token(token)
+
+
+def test_make_token_uuid_pk():
+    from uuid import uuid4
+    from django.core import signing
+    from sitegate.models import TOKEN_SALT
+    from sitegate.utils import USER
+
+    # custom user models may have non-integer primary keys
+    user = USER(username='some')
+    user.pk = uuid4()
+
+    token = EmailConfirmation.make_token(user)
+    assert signing.loads(token, salt=TOKEN_SALT)[0] == str(user.pk)
+
+
+def test_activate_code(user, db_queries):
+    user.is_active = False
+    user.save()
+    code = EmailConfirmation.add(user).code
+
+    db_queries.clear()
+    assert EmailConfirmation.activate_code(code)
+    # begin, expire code, activate user
+    assert len(db_queries) == 3
+
+    user.refresh_from_db()
+    assert user.is_active
+
+    confirmation = EmailConfirmation.objects.get(code=code)
+    assert confirmation.expired
+    assert confirmation.time_accepted
+
+    # repeated (e.g. concurrent) activation fails
+    assert not EmailConfirmation.activate_code(code)
+
+    # malformed code is rejected without queries
+    db_queries.clear()
+    assert not EmailConfirmation.activate_code('unknown')
+    assert len(db_queries) == 0
+
+
+def test_is_blacklisted(db_queries):
 
     domain = BlacklistedDomain(domain='denied1.com', enabled=False)
     assert 'denied1.com' in f'{domain}'
@@ -36,6 +106,8 @@ def test_is_blacklisted():
         BlacklistedDomain(domain='denied3.com', enabled=True),
         BlacklistedDomain(domain='denied4.co.uk', enabled=True)
     ])
+    # bulk operations do not emit signals
+    BlacklistedDomain.invalidate_index()
 
     assert not BlacklistedDomain.is_blacklisted('example1@denied1.com')
     assert BlacklistedDomain.is_blacklisted('example2@denied2.com')
@@ -45,6 +117,43 @@ def test_is_blacklisted():
     assert BlacklistedDomain.is_blacklisted('example4@denied4.co.UK')
     assert BlacklistedDomain.is_blacklisted('example4@some.Denied4.co.UK')
 
+    # index is invalidated on save and delete
+    # (bulk_create sets primary keys only on some backends and Django versions)
+    domain = BlacklistedDomain.objects.get(domain='denied1.com')
+    domain.enabled = True
+    domain.save()
+    assert BlacklistedDomain.is_blacklisted('example1@denied1.com')
+
+    domain.delete()
+    assert not BlacklistedDomain.is_blacklisted('example1@denied1.com')
+
+    # no queries for a loaded index
+    with db_queries.scope(expect=0):
+        assert BlacklistedDomain.is_blacklisted('example2@denied2.com')
+
+
+def test_blacklist_index_sync(monkeypatch):
+    from django.core.cache import cache
+    from django.db import transaction
+    from sitegate import models
+
+    BlacklistedDomain.get_index()
+    version = cache.get(models.CACHE_KEY_BLACKLIST_VERSION)
+
+    # version is bumped only on commit
+    with transaction.atomic():
+        BlacklistedDomain.objects.create(domain='denied.com')
+        assert cache.get(models.CACHE_KEY_BLACKLIST_VERSION) == version
+
+    assert cache.get(models.CACHE_KEY_BLACKLIST_VERSION) != version
+    assert BlacklistedDomain.is_blacklisted('a@denied.com')
+
+    # process-local cache can't sync processes, so DB is queried
+    monkeypatch.setattr(models, 'BLACKLIST_INDEX', None)
+    assert not BlacklistedDomain.is_index_enabled()
+    assert BlacklistedDomain.get_index() is None
+    assert BlacklistedDomain.is_blacklisted('a@denied.com')
+
 
 class TestGenericSignupFlow:
 
@@ -55,3 +164,97 @@ class TestGenericSignupFlow:
 
     def test_getflow_name(self):
         assert ModernSignup.get_flow_name() == 'ModernSignup'
+
+    def test_form_cls(self, request_get):
+        flow = ModernSignup(template='form_bootstrap', widget_attrs={'class': 'some'})
+        form = flow.get_requested_form(request_get('/'))
+
+        assert isinstance(form, ModernSignup.form)
+        assert form.template == 'sitegate/signup/form_bootstrap.html'
+        assert form.template_name == 'form_bootstrap'
+        assert form.fields['signup_flow'].initial == 'ModernSignup'
+        assert form.fields['email'].widget.attrs['class'] == 'some'
+        assert 'class' not in form.fields['signup_flow'].widget.attrs
+
+        # form class is reused
+        form_2 = ModernSignup(template='form_bootstrap', widget_attrs={'class': 'some'}).get_requested_form(
+            request_get('/'))
+        assert form_2.__class__ is form.__class__
+
+        # other widget attrs - other class, base form intact
+        form_3 = ModernSignup(template='form_bootstrap').get_requested_form(request_get('/'))
+        assert form_3.__class__ is not form.__class__
+        assert 'class' not in form_3.fields['email'].widget.attrs
+        assert 'class' not in ModernSignup.form.base_fields['email'].widget.attrs
+
+
+def test_blacklist_bulk(command_run, tmp_path, capsys):
+
+    BlacklistedDomain.objects.create(domain='existing.com', enabled=False)
+
+    src = tmp_path / 'src.csv'
+    src.write_text(
+        '# comment\n'
+        '\n'
+        'One.com\n'
+        'one.com, duplicate\n'
+        '@two.com\n'
+        'existing.com\n'
+        'three.com\n'
+    )
+
+    command_run('sitegate_blacklist_import', args=[str(src)], options={'batch_size': 2})
+    assert 'processed: 4' in capsys.readouterr().out
+    assert BlacklistedDomain.is_blacklisted('a@existing.com')
+    assert BlacklistedDomain.is_blacklisted('a@sub.one.com')
+    assert BlacklistedDomain.objects.count() == 4
+
+    assert BlacklistedDomain.bulk_load(['three.com'], enabled=False) == 1
+    assert not BlacklistedDomain.is_blacklisted('a@three.com')
+
+    command_run('sitegate_blacklist_export')
+    assert capsys.readouterr().out.split() == ['existing.com', 'one.com', 'two.com']
+
+    dst = tmp_path / 'dst.txt'
+    command_run('sitegate_blacklist_export', args=[str(dst)], options={'all': True})
+    assert dst.read_text().split() == ['existing.com', 'one.com', 'three.com', 'two.com']
+
+
+def test_blacklist_bulk_pre41(monkeypatch):
+    from sitegate import models
+
+    monkeypatch.setattr(models, 'DJANGO_POST41', False)
+    BlacklistedDomain.objects.create(domain='existing.com', enabled=False)
+
+    assert BlacklistedDomain.bulk_load(['existing.com', 'new.com'], batch_size=1) == 2
+    assert BlacklistedDomain.objects.filter(enabled=True).count() == 2
+
+
+def test_cleanup(user, command_run, capsys, db_queries):
+    codes = [EmailConfirmation.add(user) for _ in range(5)]
+
+    for code in codes[:3]:
+        code.expired = True
+        code.save()
+
+    command_run('sitegate_cleanup', args=['confirmations'], options={'dry_run': True})
+    assert 'confirmations: 3 (dry run)' in capsys.readouterr().out
+
+    db_queries.clear()
+    assert EmailConfirmation.cleanup(batch_size=2) == 3
+    # no related objects: a select and a delete per batch, and a final select
+    assert len(db_queries) == 5
+    assert list(EmailConfirmation.objects.order_by('id')) == codes[3:]
+
+    command_run('sitegate_cleanup')
+    out = capsys.readouterr().out
+    assert 'invitations: 0' in out
+    assert 'remotes: 0' in out
+
+    # abandoned (never used) codes are removed by ttl
+    EmailConfirmation.objects.filter(id=codes[3].id).update(time_created=timezone.now() - timedelta(days=10))
+    assert EmailConfirmation.cleanup(ttl=30) == 0
+
+    command_run('sitegate_cleanup', args=['confirmations'], options={'ttl': 7})
+    assert 'confirmations: 1' in capsys.readouterr().out
+    assert list(EmailConfirmation.objects.all()) == codes[4:]
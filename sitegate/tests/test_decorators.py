@@ -1,4 +1,5 @@
 from django.http import HttpResponseRedirect
+from django.utils.functional import empty
 
 from sitegate.decorators import signin_view, signup_view, redirect_signedin, sitegate_view
 from sitegate.signin_flows.classic import ClassicSignin
@@ -174,3 +175,44 @@ def test_sitegate(request_get, user_create):
     assert 'attr_name1' in field.widget.attrs
     assert response[1] == 10
     assert response[2] == 20
+
+
+def test_flows_reused(request_get, user_create):
+    # parametrized decoration
+    view = signin_view(flow=ClassicSignin)(signup_view(flow=ClassicSignup)(lambda req: req))
+    flow_signup, flow_signin = view.sitegate_flows
+    assert isinstance(flow_signup, ClassicSignup)
+    assert isinstance(flow_signin, ClassicSignin)
+
+    for _ in range(2):
+        response = view(request_get('/entrance/'))
+        assert response.sitegate['signup_forms']['ClassicSignup'].flow is flow_signup
+        assert response.sitegate['signin_forms']['ClassicSignin'].flow is flow_signin
+
+    # simple decoration
+    view = sitegate_view(lambda req: req)
+    flow_signin, flow_signup = view.sitegate_flows
+    assert isinstance(flow_signup, ModernSignup)
+    assert isinstance(flow_signin, ModernSignin)
+
+    for _ in range(2):
+        response = view(request_get('/entrance/', user=user_create(anonymous=True)))
+        assert response.sitegate['signup_forms']['ModernSignup'].flow is flow_signup
+        assert response.sitegate['signin_forms']['ModernSignin'].flow is flow_signin
+
+
+def test_forms_lazy(request_get, request_post, user_create):
+    view = signin_view(signup_view(lambda req: req))
+
+    # forms are not constructed unless accessed
+    response = view(request_get('/entrance/'))
+    form = response.sitegate['signin_forms']['ModernSignin']
+    assert form._wrapped is empty
+    assert 'password' in form.fields
+    assert form._wrapped is not empty
+
+    # only submitted form is constructed
+    request = request_post('/entrance/', data={'signin_flow': 'ModernSignin'}, user=user_create(anonymous=True))
+    response = view(request)
+    assert response.sitegate['signin_forms']['ModernSignin'].errors
+    assert response.sitegate['signup_forms']['ModernSignup']._wrapped is empty
@@ -1,5 +1,6 @@
 from sitegate.signup_flows.classic import ClassicWithEmailSignup, ClassicWithEmailSignupForm, ClassicSignupForm, \
     SimpleClassicSignupForm, SimpleClassicWithEmailSignupForm
+from sitegate.models import EmailConfirmation
 from sitegate.utils import get_username_field
 
 
@@ -32,6 +33,42 @@ def test_signup(request_get, messages):
     new_user = flow.add_user(request_get('/'), form)
     assert new_user.username == 'abcom'
 
+    # stateless activation token
+    flow = ClassicWithEmailSignup(verify_email=True, verify_email_stateless=True)
+    form = ClassicWithEmailSignupForm({
+        'username': 'abcom2',
+        'email': 'a2@b.com',
+        'password1': 'qwerty',
+        'password2': 'qwerty',
+    })
+    form.flow = flow
+    urls = []
+    flow.schedule_email = lambda text, user, title: urls.append(text)
+
+    flow.add_user(request_get('/'), form)
+    assert not EmailConfirmation.objects.filter(user__username='abcom2').exists()
+    assert ':' in urls[0]
+
+
+def test_existence_checks_unique(monkeypatch):
+    form = ClassicWithEmailSignupForm({
+        'username': 'abcom',
+        'email': 'a@b.com',
+        'password1': 'Qwe1rty!Uio2',
+        'password2': 'Qwe1rty!Uio2',
+    })
+    form.flow = ClassicWithEmailSignup()
+
+    calls = []
+    get_checks = form.get_existence_checks
+    monkeypatch.setattr(form, 'get_existence_checks', lambda: calls.append(1) or get_checks())
+
+    assert form.is_valid()
+    assert len(calls) == 1
+    # blacklist check does not validate e-mail uniqueness,
+    # so it is left to the model (e.g. custom user with unique e-mail)
+    assert form._unique_checked == {'username'}
+
 
 class TestClassicSignupForms:
 
@@ -151,3 +188,58 @@ class TestClassicSignupForms:
 #         assert 'email' in fields
 #         assert 'password1' in fields
 #         assert 'password2' not in fields
+
+
+def test_outbox(request_get, messages, mail_outbox, command_run, capsys, monkeypatch):
+    from django.db import transaction
+    from sitegate.models import OutboxEmail
+    from sitegate.signup_flows import classic
+
+    monkeypatch.setattr(classic, 'USE_OUTBOX', True)
+    flow = ClassicWithEmailSignup(verify_email=True)
+
+    def sign_up(username):
+        form = ClassicWithEmailSignupForm({
+            'username': username,
+            'email': f'{username}@b.com',
+            'password1': 'qwerty',
+            'password2': 'qwerty',
+        })
+        form.flow = flow
+        flow.add_user(request_get('/'), form)
+
+    with transaction.atomic():
+        sign_up('one')
+        sign_up('two')
+        # e-mails are put into outbox on commit
+        assert not OutboxEmail.objects.exists()
+
+    # nothing is sent within a request
+    assert not mail_outbox
+
+    assert OutboxEmail.objects.count() == 2
+
+    # retry with backoff
+    class FailingConnection:
+
+        def open(self):
+            raise ConnectionError('relay is down')
+
+        def close(self):
+            pass
+
+    assert OutboxEmail.send_batch(connection=FailingConnection(), max_attempts=2) == (0, 2)
+    email = OutboxEmail.objects.first()
+    assert email.attempts == 1
+    assert email.error == 'relay is down'
+    assert not email.failed
+    # not due yet
+    assert OutboxEmail.send_batch() == (0, 0)
+
+    OutboxEmail.objects.update(time_dispatch=email.time_created)
+
+    command_run('sitegate_outbox_send', options={'batch_size': 1})
+    assert 'sent: 2, failed: 0' in capsys.readouterr().out
+    assert not OutboxEmail.objects.exists()
+    assert [message.to for message in mail_outbox] == [['one@b.com'], ['two@b.com']]
+    assert 'Account activation' in mail_outbox[0].subject
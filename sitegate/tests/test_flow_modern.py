@@ -1,8 +1,10 @@
 import pytest
+from django import VERSION
 from django.urls import reverse
 
 from sitegate.signin_flows.modern import ModernSigninForm
 from sitegate.signup_flows.modern import ModernSignupForm, InvitationSignupForm
+from sitegate.utils import USER
 
 URL_REGISTER = reverse('register')
 URL_LOGIN = reverse('login')
@@ -77,6 +79,174 @@ def test_modern_signin(user_signin, user_signup, user_create, user_model):
     assert b'There is more than one user with this e-mail.' in response.content
 
 
+def test_modern_signin_email_backend(settings, user_create, request_post, db_queries):
+    from django.db import connection
+    from sitegate.backends import EmailOrUsernameBackend
+
+    settings.AUTHENTICATION_BACKENDS = ['sitegate.backends.EmailOrUsernameBackend']
+
+    user = user_create(attributes={'email': 'Some@host.com'})
+
+    def sign_in(username, password=user.password_plain):
+        form = ModernSigninForm(request_post(), data={'username': username, 'password': password})
+        db_queries.clear()
+        valid = form.is_valid()
+        return valid, form
+
+    # e-mail, case-insensitive, single query
+    valid, form = sign_in('some@HOST.com')
+    assert valid
+    assert len(db_queries) == 1
+    assert form.get_user() == user
+    assert form.get_user().backend == 'sitegate.backends.EmailOrUsernameBackend'
+
+    # username
+    valid, form = sign_in(user.username)
+    assert valid
+    assert len(db_queries) == 1
+
+    # wrong password
+    valid, form = sign_in('some@host.com', 'bogus')
+    assert not valid
+    assert 'Please enter a correct username and password' in form.errors['__all__'][0]
+
+    # ambiguous
+    user_create(attributes={'email': 'some@host.COM'})
+    valid, form = sign_in('some@host.com')
+    assert not valid
+    assert 'There is more than one user' in form.errors['__all__'][0]
+
+    # backend for authenticate()
+    backend = EmailOrUsernameBackend()
+    assert backend.authenticate(None, username=user.username, password=user.password_plain) == user
+    assert backend.authenticate(None, username='some@host.com', password=user.password_plain) is None
+    assert backend.authenticate(None, username='nobody', password=user.password_plain) is None
+
+    if VERSION >= (3, 2):
+        # functional index from migration
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, user._meta.db_table)
+        assert 'sitegate_user_email_lower_idx' in constraints
+
+
+class StubBackend:
+    """Authenticates a user unknown to EmailOrUsernameBackend (e.g. LDAP)."""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username == 'external' and password == 'secret':
+            return USER.objects.get(username='stored')
+
+    def get_user(self, user_id):
+        return USER.objects.filter(pk=user_id).first()
+
+
+def test_modern_signin_email_backend_others(settings, user_create, request_post):
+
+    settings.AUTHENTICATION_BACKENDS = [
+        'sitegate.backends.EmailOrUsernameBackend',
+        'sitegate.tests.test_flow_modern.StubBackend',
+    ]
+    user = user_create(attributes={'username': 'stored'})
+
+    form = ModernSigninForm(request_post(), data={'username': 'external', 'password': 'secret'})
+    assert form.is_valid()
+    assert form.get_user() == user
+    assert form.get_user().backend == 'sitegate.tests.test_flow_modern.StubBackend'
+
+
+def test_modern_signin_throttle(user_create, request_post, db_queries, monkeypatch):
+    from django.contrib.auth import base_user
+    from sitegate.signin_flows.modern import ModernSignin
+    from sitegate.throttling import Throttle
+
+    user = user_create()
+    flow = ModernSignin(throttle={'username': 2, 'ip': 3})
+
+    def sign_in(username, ip='10.0.0.1'):
+        request = request_post(data={
+            'signin_flow': 'ModernSignin', 'username': username, 'password': 'bogus'},
+            REMOTE_ADDR=ip)
+        db_queries.clear()
+        flow.respond_for(lambda request: None, [request], {})
+        return request.sitegate['signin_forms']['ModernSignin']
+
+    assert 'correct username' in sign_in(user.username).errors['__all__'][0]
+    assert 'correct username' in sign_in(user.username).errors['__all__'][0]
+
+    def hash_fail(*args, **kwargs):
+        raise AssertionError('hasher called')
+
+    monkeypatch.setattr(base_user, 'check_password', hash_fail)
+
+    # username limit is reached. no DB or hasher hit
+    form = sign_in(user.username.upper())
+    assert form.errors['__all__'] == ['Too many sign in attempts. Please try again later.']
+    assert len(db_queries) == 0
+
+    # ip limit is reached
+    monkeypatch.undo()
+    sign_in('other')
+    assert 'Too many' in sign_in('another').errors['__all__'][0]
+    assert 'correct username' in sign_in('another', ip='10.0.1.1').errors['__all__'][0]
+
+    # sliding window
+    throttle = Throttle('some', window=10, ip=2)
+    values = {'ip': '1', 'username': 'x'}
+    for now in range(5, 9):
+        throttle.register(values, now=now)
+    assert throttle.is_exceeded(values, now=9) == 'ip'
+    assert throttle.is_exceeded(values, now=14) == 'ip'  # 4 * 0.6
+    assert throttle.is_exceeded(values, now=16) is None  # 4 * 0.4
+    assert throttle.is_exceeded(values, now=21) is None
+
+
+def test_modern_signup_throttle(request_post, db_queries, user_model):
+    from django.contrib.sessions.backends.db import SessionStore
+    from sitegate.signals import sig_user_signup_fail
+    from sitegate.signup_flows.modern import ModernSignup
+
+    flow = ModernSignup(
+        throttle={'ip': 3, 'subnet': 0}, throttle_success={'domain': 1},
+        auto_signin=False, validate_email_domain=False)
+
+    reasons = []
+
+    def on_fail(sender, reason, **kwargs):
+        reasons.append(reason)
+
+    sig_user_signup_fail.connect(on_fail)
+
+    def sign_up(email, ip='10.0.0.1'):
+        request = request_post(data={
+            'signup_flow': 'ModernSignup', 'email': email, 'password1': 'Qwe1rty!Uio2'},
+            REMOTE_ADDR=ip)
+        request.session = SessionStore()
+        db_queries.clear()
+        flow.respond_for(lambda request: None, [request], {})
+        return getattr(request, 'sitegate', {}).get('signup_forms', {}).get('ModernSignup')
+
+    try:
+        sign_up('one@host.com')
+
+        # domain success limit is reached
+        form = sign_up('two@host.com')
+        assert form.errors['__all__'] == ['Too many sign up attempts. Please try again later.']
+        assert len(db_queries) == 0
+        assert reasons == ['throttled_success']
+
+        # ip attempts limit is reached
+        sign_up('bogus')
+        form = sign_up('two@other.com')
+        assert 'Too many sign up' in form.errors['__all__'][0]
+        assert reasons == ['throttled_success', 'throttled']
+
+        sign_up('two@other.com', ip='10.0.1.1')
+        assert list(user_model.objects.values_list('email', flat=True)) == ['one@host.com', 'two@other.com']
+
+    finally:
+        sig_user_signup_fail.disconnect(on_fail)
+
+
 def test_modern_signup(user_signin, user_signup, user_create, user_model):
 
     user = user_create(attributes={'email': 'user@host.com'})
@@ -110,6 +280,92 @@ def test_modern_signup(user_signin, user_signup, user_create, user_model):
     assert b'length should be no more than' in response.content
 
 
+def test_invitation_signup_checks(user_create, db_queries):
+    from sitegate.models import BlacklistedDomain, InvitationCode
+    from sitegate.signup_flows.modern import InvitationSignup
+
+    user = user_create(attributes={'email': 'Taken@host.com'})
+    code = InvitationCode.add(user).code
+    BlacklistedDomain.objects.create(domain='denied.com')
+
+    def validate(data):
+        form = InvitationSignupForm(data=dict({'password1': 'Qwe1rty!Uio2'}, **data))
+        form.flow = InvitationSignup()
+        BlacklistedDomain.get_index()
+        db_queries.clear()
+        form.is_valid()
+        return form
+
+    # all checks in one query
+    form = validate({'code': 'bogus', 'email': 'taken@HOST.com'})
+    assert len(db_queries) == 1
+    assert form.errors['code'] == ['This invitation code is invalid.']
+    assert form.errors['email'] == ['A user with that e-mail already exists.']
+
+    form = validate({'code': code, 'email': 'new@denied.com'})
+    assert list(form.errors) == ['email']
+    assert form.errors['email'] == ['Sign Up with this email domain is not allowed.']
+
+    form = validate({'code': code, 'email': 'new@host.com'})
+    assert len(db_queries) == 1
+    assert not form.errors
+
+
+def test_invitation_signup_code_formats(user, monkeypatch):
+    from sitegate import codes
+    from sitegate.models import InvitationCode
+    from sitegate.signup_flows.modern import InvitationSignup
+
+    legacy = InvitationCode.add(user).code
+    monkeypatch.setattr(codes, 'CODE_FORMAT', 'sitegate.codes.ChecksumCodeFormat')
+    new = InvitationCode.add(user).code
+
+    def validate(code):
+        form = InvitationSignupForm(data={'code': code, 'email': 'new@host.com', 'password1': 'Qwe1rty!Uio2'})
+        form.flow = InvitationSignup()
+        form.is_valid()
+        return form
+
+    # legacy codes are kept intact, new ones are normalized
+    for code in (legacy, f' {legacy} ', new, new.lower().replace('-', '')):
+        form = validate(code)
+        assert 'code' not in form.errors, code
+        assert form.cleaned_data['code'] in {legacy, new}
+
+    form = validate(legacy.upper())
+    assert form.errors['code'] == ['This invitation code is invalid.']
+
+
+def test_signup_signin_hashing(request_post, monkeypatch):
+    from django.contrib.auth import base_user, SESSION_KEY
+    from django.contrib.sessions.backends.db import SessionStore
+    from sitegate.signup_flows.modern import ModernSignup
+
+    hashed = []
+
+    def count(func):
+        def wrapper(*args, **kwargs):
+            hashed.append(func.__name__)
+            return func(*args, **kwargs)
+        return wrapper
+
+    monkeypatch.setattr(base_user, 'make_password', count(base_user.make_password))
+    monkeypatch.setattr(base_user, 'check_password', count(base_user.check_password))
+
+    flow = ModernSignup()
+    form = ModernSignupForm(data={'email': 'new@host.com', 'password1': 'Qwe1rty!Uio2'})
+    form.flow = flow
+    assert form.is_valid()
+
+    request = request_post()
+    request.session = SessionStore()
+    flow.handle_form_valid(request, form)
+
+    # password is hashed once on user creation and is not checked on sign in
+    assert hashed == ['make_password']
+    assert request.session[SESSION_KEY] == str(form.instance.pk)
+
+
 class TestModernSignupForms:
 
     def test_modern_signup_attrs(self):
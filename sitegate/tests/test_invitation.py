@@ -23,3 +23,137 @@ def test_accept(user):
     assert updated_code.acceptor == user
     assert updated_code.time_accepted
     assert updated_code.expired
+
+
+def test_accept_multi(user_create, db_queries):
+    creator = user_create()
+    code = InvitationCode.add(creator, max_uses=2).code
+    acceptor_1, acceptor_2, acceptor_3 = user_create(), user_create(), user_create()
+
+    db_queries.clear()
+    assert InvitationCode.accept(code, acceptor_1) == 1
+    # begin, update counter, insert redemption
+    assert len(db_queries) == 3
+    # expiry is computed before increment (MySQL evaluates SET left to right)
+    sql_update = db_queries.sql()[0]
+    assert sql_update.index('"expired"') < sql_update.index('"uses"')
+    assert not InvitationCode.objects.get(code=code).expired
+    assert InvitationCode.is_valid(code)
+
+    assert InvitationCode.accept(code, acceptor_2) == 1
+    # quota is exhausted
+    assert InvitationCode.accept(code, acceptor_3) == 0
+
+    code = InvitationCode.objects.get(code=code)
+    assert code.uses == 2
+    assert code.expired
+    assert not InvitationCode.is_valid(code.code)
+    assert [redemption.acceptor for redemption in code.redemptions.order_by('id')] == [acceptor_1, acceptor_2]
+
+    # used codes are kept with their redemptions on cleanup
+    unused = InvitationCode.add(creator)
+    unused.expired = True
+    unused.save()
+
+    assert InvitationCode.cleanup() == 1
+    assert list(InvitationCode.objects.all()) == [code]
+    assert code.redemptions.count() == 2
+
+
+def test_signup_exhausted(user, mail_outbox):
+    from sitegate.signup_flows.modern import InvitationSignup, InvitationSignupForm
+    from sitegate.utils import USER
+
+    code = InvitationCode.add(user).code
+
+    flow = InvitationSignup(verify_email=True)
+    form = InvitationSignupForm(data={'code': code, 'email': 'new@host.com', 'password1': 'Qwe1rty!Uio2'})
+    form.flow = flow
+    assert form.is_valid()
+
+    # code is redeemed concurrently: user is rolled back and no e-mail is sent
+    InvitationCode.accept(code, user)
+    assert flow.add_user(None, form) is None
+    assert not mail_outbox
+    assert not USER.objects.filter(email='new@host.com').exists()
+
+
+def test_add_bulk(user, monkeypatch, command_run, capsys):
+    InvitationCode.add(user)
+    existing = InvitationCode.objects.first().code
+
+    generated = iter([existing, 'a', 'b', 'c'])
+    monkeypatch.setattr(InvitationCode, 'generate_code', lambda: next(generated))
+
+    # first code collides and is topped up
+    codes = InvitationCode.add_bulk(user, 3, batch_size=2)
+    assert sorted(codes) == ['a', 'b', 'c']
+    assert InvitationCode.objects.count() == 4
+    monkeypatch.undo()
+
+    command_run('sitegate_invitations_add', args=[user.username, 5], options={'max_uses': 3})
+    assert len(capsys.readouterr().out.split()) == 5
+    assert InvitationCode.objects.filter(creator=user).count() == 9
+    assert InvitationCode.objects.filter(creator=user, max_uses=3).count() == 5
+
+
+def test_code_formats(user, monkeypatch, db_queries):
+    from sitegate import codes
+    from sitegate.codes import ChecksumCodeFormat
+
+    code_format = ChecksumCodeFormat()
+    code = code_format.generate()
+    assert len(code) == 24
+    assert code_format.check(code)
+    assert code_format.normalize(f" {code.replace('-', '').lower()} ") == code
+    assert not code_format.check(code.lower())
+    assert not code_format.check(code[:-1] + ('0' if code[-1] != '0' else '1'))
+    assert not code_format.check('42')
+
+    legacy = InvitationCode.add(user).code
+    assert len(legacy) == 32
+
+    monkeypatch.setattr(codes, 'CODE_FORMAT', 'sitegate.codes.ChecksumCodeFormat')
+    new = InvitationCode.add(user).code
+    assert len(new) == 24
+
+    db_queries.clear()
+
+    # malformed codes are rejected without DB queries
+    for junk in ('', '42', 'x' * 32, legacy.upper(), new.replace('-', '')):
+        assert not InvitationCode.is_valid(junk)
+        assert not InvitationCode.filter_valid(junk)
+        assert not InvitationCode.accept(junk, user)
+
+    assert len(db_queries) == 0
+
+    assert InvitationCode.is_valid(new)
+    assert InvitationCode.is_valid(legacy)
+
+    monkeypatch.setattr(codes, 'CODE_FORMATS_LEGACY', [])
+    assert not InvitationCode.is_valid(legacy)
+
+
+def test_migration_redemptions(user_create):
+    from datetime import timedelta
+    from importlib import import_module
+    from django.apps import apps
+    from django.utils import timezone
+
+    migration = import_module('sitegate.migrations.0006_invitationcode_uses')
+
+    creator, acceptor = user_create(), user_create()
+    time_accepted = timezone.now() - timedelta(days=3)
+    code = InvitationCode.add(creator)
+    InvitationCode.objects.filter(id=code.id).update(
+        acceptor=acceptor, expired=True, time_accepted=time_accepted, uses=1)
+
+    # accepted before redemptions were introduced
+    assert InvitationCode.cleanup(dry_run=True) == 1
+
+    migration.add_redemptions(apps, None)
+
+    redemption = code.redemptions.get()
+    assert redemption.acceptor == acceptor
+    assert redemption.time_created == time_accepted
+    assert InvitationCode.cleanup(dry_run=True) == 0
@@ -1,13 +1,22 @@
 from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from time import sleep
 
 import pytest
 from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.db import IntegrityError
 from django.urls import reverse
 from django.utils.timezone import now
+from requests import HTTPError
 
+from sitegate.exceptions import RemoteUnavailable
 from sitegate.models import RemoteRecord
+from sitegate.signin_flows.modern import ModernSignin
 from sitegate.signin_flows.remotes.base import Remote, UserData
-from sitegate.utils import get_registered_remotes
+from sitegate.utils import get_registered_remotes, register_remotes
+from sitegate.views import remote_auth_async, remote_auth_start_async
 
 
 def test_links(request_client):
@@ -36,13 +45,14 @@ def test_records(user):
     create(remote='e', user=user, remote_id='xx', old=True)
     create(remote='f', user=user, remote_id='xx')
 
-    RemoteRecord.cleanup(ago=5)
+    assert RemoteRecord.cleanup(ago=5, dry_run=True) == 1
+    assert RemoteRecord.cleanup(ago=5) == 1
     left = list(RemoteRecord.objects.order_by('id').values_list('remote', flat=True))
 
     assert left == ['b', 'c', 'd', 'e', 'f']
 
 
-def test_remote_construct_user(request_post):
+def test_remote_construct_user(request_post, db_queries):
     remote = Remote(client_id='x')
     construct = remote.construct_user
 
@@ -82,15 +92,24 @@ def test_remote_construct_user(request_post):
     assert user_3.username == 'oneman@2'
 
     # and yet another user with the same name
-    # and email as nonactive user. give up trying
+    # and email as nonactive user. use suffix
     user_3.is_active = False
     user_3.save()
     bogus_data = UserData(
         username='one', emails=['oneman@2'],
         remote_id='', first_name='', last_name='',
     )
+    db_queries.clear()
     user_4 = construct(bogus_data)
-    assert user_4 is None
+    assert user_4.username == 'one_1'
+    # users by email, taken usernames, savepoint, insert
+    assert len(db_queries) == 4
+
+    # give up trying
+    user_4.is_active = False
+    user_4.save()
+    remote.username_suffixes = 1
+    assert construct(bogus_data) is None
 
     # check proper auth_finish failure
     record = RemoteRecord(remote='')
@@ -209,6 +228,81 @@ def test_common(alias, data_url, data_response, request_client, response_mock, u
     assert record_2.remote_id == 'xx2'
 
 
+def test_stateless(request_client, response_mock, user_create, monkeypatch, db_queries):
+    from sitegate.signin_flows.remotes.yandex import Yandex
+
+    monkeypatch.setattr('sitegate.utils._REMOTES_REGISTRY', {})
+    remote = Yandex(client_id='yandex-clid', stateless=True)
+    register_remotes(remote)
+
+    data_url = 'https://login.yandex.ru/info?format=json'
+    data_response = '{"id":"xx1", "login": "xx3", "emails": ["xx3@xx3"], "first_name": "xx4"}'
+
+    client = request_client()
+
+    db_queries.clear()
+    response = client.post(remote.url_auth_start)
+    assert response.status_code == 302
+    # no records are written on start
+    assert not RemoteRecord.objects.exists()
+    assert not [query for query in db_queries.get_log() if 'INSERT' in query['sql']]
+
+    ticket = response.url.partition('state=')[2].partition('&')[0]
+    assert ':' in ticket
+    assert remote.ticket_cookie_name == 'sitegate_rticket_yandex'
+    assert remote.ticket_cookie_name in response.cookies
+
+    def finish(client, ticket):
+        return client.post(remote.url_auth_continue, data={'access_token': 'dummy', 'state': ticket})
+
+    # tampered ticket
+    finish(client, f'{ticket}x')
+    # another browser (no nonce cookie)
+    finish(request_client(), ticket)
+    # another user
+    finish(request_client(user=user_create()), ticket)
+    assert not RemoteRecord.objects.exists()
+
+    with response_mock(f'GET {data_url} -> 200:{data_response}'):
+        response = finish(client, ticket)
+    assert response.status_code == 302
+
+    record = RemoteRecord.objects.get()
+    assert record.remote == 'yandex'
+    assert record.remote_id == 'xx1'
+    assert record.user.username == 'xx3'
+    assert record.time_accepted
+
+    # expired ticket
+    monkeypatch.setattr(remote, 'ticket_max_age', -1)
+    assert not remote.check_ticket(client.get(remote.url_auth_continue).wsgi_request, ticket)
+
+
+def test_stateless_multiple(request_client, user_create, monkeypatch):
+    from sitegate.signin_flows.remotes.google import Google
+    from sitegate.signin_flows.remotes.yandex import Yandex
+
+    monkeypatch.setattr('sitegate.utils._REMOTES_REGISTRY', {})
+    yandex = Yandex(client_id='yandex-clid', stateless=True)
+    google = Google(client_id='google-clid', stateless=True)
+    register_remotes(yandex, google)
+
+    user = user_create()
+    client = request_client(user=user)
+
+    def get_ticket(remote):
+        response = client.post(remote.url_auth_start)
+        return response.url.partition('state=')[2].partition('&')[0]
+
+    ticket_yandex = get_ticket(yandex)
+    # starting another remote does not break the first one
+    ticket_google = get_ticket(google)
+
+    request = client.get(yandex.url_auth_continue).wsgi_request
+    assert yandex.check_ticket(request, ticket_yandex)
+    assert google.check_ticket(request, ticket_google)
+
+
 def test_auth_remote_start(user_create, request_client):
 
     alias = 'yandex'
@@ -261,3 +355,317 @@ def test_google(response_mock, request_post):
     with response_mock(f'GET {url} -> 200:{data}'):
         result = remote.get_user_data(request_post(), data={})
         assert result is None  # verified_email: false
+
+
+def test_records_indexes(user):
+    manager = RemoteRecord.objects
+
+    plan = manager.filter(remote='yandex', remote_id='xx').explain()
+    assert 'sitegate_rr_remote_rid_uniq' in plan
+
+    plan = manager.filter(user=user, remote='yandex').explain()
+    assert 'sitegate_rr_user_remote_idx' in plan
+
+    RemoteRecord.objects.create(remote='yandex', remote_id='xx', code='a')
+    RemoteRecord.objects.create(remote='yandex', remote_id=None, code='b')
+    RemoteRecord.objects.create(remote='yandex', remote_id=None, code='c')
+
+    with pytest.raises(IntegrityError):
+        RemoteRecord.objects.create(remote='yandex', remote_id='xx', code='d')
+
+
+def test_async(request_post, request_get, response_mock, user_create, monkeypatch):
+    async_to_sync = pytest.importorskip('asgiref.sync').async_to_sync
+    # requests run in a thread are mocked
+    monkeypatch.setattr('sitegate.signin_flows.remotes.base.httpx', None)
+
+    alias = 'yandex'
+    remote = get_registered_remotes()[alias]
+    anonymous = user_create(anonymous=True)
+
+    response = async_to_sync(remote_auth_start_async)(request_post('/', user=anonymous), alias)
+    assert response.status_code == 302
+    record = RemoteRecord.objects.first()
+
+    response = async_to_sync(remote_auth_async)(request_get('/', user=anonymous), alias)
+    assert 'Signing in with' in response.content.decode()
+
+    request = request_post('/', data={'access_token': 'dummy', 'state': record.code}, user=anonymous)
+    request.session = SessionStore()
+
+    with response_mock(f'GET {remote.url_user_data} -> 200:{{"id": "xx1", "login": "xx3", "emails": ["xx3@xx3"]}}'):
+        response = async_to_sync(remote_auth_async)(request, alias)
+        assert response.status_code == 302
+
+    record.refresh_from_db()
+    assert record.remote_id == 'xx1'
+    assert record.user.username == 'xx3'
+
+    # unknown remote
+    response = async_to_sync(remote_auth_async)(request_get('/', user=anonymous), 'bogus')
+    assert response.status_code == 400
+
+
+@pytest.fixture
+def stub_server():
+    """Local HTTP server answering with prepared (status, body) responses."""
+
+    class Handler(BaseHTTPRequestHandler):
+
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            status, body = responses.pop(0)
+            clients.add(self.client_address)
+            body = body.encode()
+
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', f'{len(body)}')
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    responses = []
+    clients = set()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.responses = responses
+    server.clients = clients
+    server.url = f'http://127.0.0.1:{server.server_port}/'
+
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+def test_request_json(stub_server, monkeypatch):
+    monkeypatch.setattr('sitegate.utils._REMOTES_REGISTRY', {})
+
+    remote = Remote(client_id='x', http={'pool_size': 3})
+    register_remotes(remote, http={'backoff': 0, 'pool_size': 2})
+    assert remote.http['pool_size'] == 2
+    assert remote.http['retries'] == 2
+
+    responses = stub_server.responses
+    url = stub_server.url
+
+    # retries on server errors
+    responses.extend([(503, ''), (502, ''), (200, '{"a": 1}')])
+    assert remote._request_json(url) == {'a': 1}
+    assert not responses
+
+    # connection is kept alive
+    responses.append((200, '{"b": 2}'))
+    assert remote._request_json(url) == {'b': 2}
+    assert len(stub_server.clients) == 1
+
+    # retries are bounded
+    responses.extend([(503, '')] * 3)
+    with pytest.raises(HTTPError):
+        remote._request_json(url)
+    assert not responses
+
+    # client errors are not retried
+    responses.extend([(404, ''), (200, '{}')])
+    with pytest.raises(HTTPError):
+        remote._request_json(url)
+    assert len(responses) == 1
+    responses.clear()
+
+    # no retries after the overall deadline
+    remote.configure_http(deadline=0.001)
+    responses.extend([(503, ''), (200, '{}')])
+    with pytest.raises(HTTPError):
+        remote._request_json(url)
+    assert len(responses) == 1
+
+
+def test_breaker(stub_server, monkeypatch, request_get):
+    monkeypatch.setattr('sitegate.utils._REMOTES_REGISTRY', {})
+
+    class Stub(Remote):
+        alias = 'stub'
+
+    remote = Stub(client_id='x', http={'backoff': 0, 'retries': 0})
+    register_remotes(remote, breaker={'min_requests': 2, 'failure_rate': 0.5, 'open_for': 0.3})
+    assert remote.available
+
+    responses = stub_server.responses
+    url = stub_server.url
+
+    responses.extend([(200, '{}'), (500, ''), (500, '')])
+    remote._request_json(url)
+
+    with pytest.raises(HTTPError):
+        remote._request_json(url)
+
+    # breaker is open
+    assert not remote.available
+    assert responses
+    with pytest.raises(RemoteUnavailable):
+        remote._request_json(url)
+
+    # sign in form hides unavailable remotes
+    form = ModernSignin().get_requested_form(request_get('/'))
+    assert form.remotes == []
+
+    sleep(0.3)
+
+    # half-open: probe fails and breaker opens again
+    assert remote.available
+    with pytest.raises(HTTPError):
+        remote._request_json(url)
+    assert not remote.available
+
+    sleep(0.3)
+
+    # probe succeeds and breaker closes
+    responses.extend([(200, '{"a": 1}'), (200, '{"a": 2}')])
+    assert remote._request_json(url) == {'a': 1}
+    assert remote._request_json(url) == {'a': 2}
+    assert remote.available
+
+    stats = remote.stats.get()
+    assert stats['requests'] == 5
+    assert stats['errors'] == 2
+    assert stats['rejected'] == 1
+    assert sum(stats['latency_histogram'].values()) == 5
+
+
+def test_breaker_client_errors(stub_server, monkeypatch):
+    monkeypatch.setattr('sitegate.utils._REMOTES_REGISTRY', {})
+
+    class Stub(Remote):
+        alias = 'stub4xx'
+
+    remote = Stub(client_id='x', http={'backoff': 0, 'retries': 0})
+    register_remotes(remote, breaker={'min_requests': 2, 'failure_rate': 0.5})
+
+    responses = stub_server.responses
+    url = stub_server.url
+
+    # bogus tokens sent by clients do not open the breaker
+    responses.extend([(401, '')] * 4)
+    for _ in range(4):
+        with pytest.raises(HTTPError):
+            remote._request_json(url)
+
+    assert remote.available
+    assert remote.stats.get()['errors'] == 4
+
+    # too many requests is a remote failure
+    responses.extend([(429, '')] * 4)
+    for _ in range(4):
+        with pytest.raises(HTTPError):
+            remote._request_json(url)
+
+    assert not remote.available
+
+
+def test_breaker_window():
+    from sitegate.signin_flows.remotes.breaker import CircuitBreaker
+
+    breaker = CircuitBreaker('windowed', window=60)
+    key_total, key_failed = breaker.get_counter_keys(now=120)
+    assert key_total.endswith('_total_2')
+    assert key_failed.endswith('_failed_2')
+
+    # counters of different windows never mix
+    assert breaker.get_counter_keys(now=180)[0].endswith('_total_3')
+
+
+def test_compat_classmethod(stub_server, monkeypatch):
+    monkeypatch.setattr('sitegate.utils._REMOTES_REGISTRY', {})
+
+    class Legacy(Remote):
+        alias = 'legacy'
+
+        @classmethod
+        def _get_user_data(cls, request, *, data):
+            # written for the previous classmethod-based API
+            return cls._request_json(data['url'])
+
+    remote = Legacy(client_id='x', http={'backoff': 0})
+    register_remotes(remote)
+
+    stub_server.responses.append((200, '{"a": 1}'))
+
+    with pytest.warns(DeprecationWarning):
+        assert remote.get_user_data(None, data={'url': stub_server.url}) == {'a': 1}
+
+    # registered object is used
+    assert remote.stats.get()['requests'] == 1
+
+
+def test_async_client_reuse(monkeypatch):
+    import asyncio
+    httpx = pytest.importorskip('httpx')
+
+    remote = Remote(client_id='x', http={'backoff': 0})
+    requested = []
+
+    def handle(request):
+        requested.append(request.url)
+        return httpx.Response(200, json={'a': len(requested)})
+
+    monkeypatch.setattr(
+        remote, '_make_async_client', lambda: httpx.AsyncClient(transport=httpx.MockTransport(handle)))
+
+    async def fetch():
+        client = remote._get_async_client()
+        url = 'http://remote.local/'
+        result = [await remote._arequest_json(url), await remote._arequest_json(url)]
+        # one client per event loop
+        assert remote._get_async_client() is client
+        return result, client
+
+    (result_1, client_1), (result_2, client_2) = asyncio.run(fetch()), asyncio.run(fetch())
+    assert result_1 == [{'a': 1}, {'a': 2}]
+    assert client_1 is not client_2
+
+
+def test_async_httpx(monkeypatch):
+    import asyncio
+    httpx = pytest.importorskip('httpx')
+
+    remote = Remote(client_id='x', http={'backoff': 0, 'retries': 2})
+    responses = []
+
+    def handle(request):
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    monkeypatch.setattr(
+        remote, '_make_async_client', lambda: httpx.AsyncClient(transport=httpx.MockTransport(handle)))
+
+    url = 'http://remote.local/'
+
+    # connection error and server error are retried
+    responses.extend([
+        httpx.ConnectError('refused'),
+        httpx.Response(503),
+        httpx.Response(200, json={'a': 1}),
+    ])
+    assert asyncio.run(remote._afetch_json(url)) == {'a': 1}
+    assert not responses
+
+    # retries exhausted
+    responses.extend([httpx.Response(502)] * 3)
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(remote._afetch_json(url))
+    assert not responses
+
+    # client errors are not retried
+    responses.extend([httpx.Response(404), httpx.Response(200, json={})])
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(remote._afetch_json(url))
+    assert len(responses) == 1
@@ -0,0 +1,73 @@
+from django.core.cache import cache
+from django.template.base import Template
+from django.template.context import Context
+from django.template.engine import Engine
+from django.utils.functional import empty
+
+from sitegate.decorators import signin_view, signup_view
+
+
+def test_flow_form(request_get, user_create, monkeypatch):
+
+    template = Template(
+        '{% load sitegate %}'
+        '{% sitegate_signin_form %}{% sitegate_signup_form %}'
+        '{% sitegate_signin_form for ModernSignin %}{% sitegate_signup_form for ModernSignup %}'
+    )
+
+    calls = []
+    get_template = Engine.get_template
+
+    def get_template_(self, name):
+        calls.append(name)
+        return get_template(self, name)
+
+    monkeypatch.setattr(Engine, 'get_template', get_template_)
+
+    view = signin_view(signup_view(lambda req: req))
+
+    for _ in range(3):
+        request = view(request_get('/entrance/', user=user_create(anonymous=True)))
+        context = Context({'request': request})
+        dicts_len = len(context.dicts)
+
+        rendered = template.render(context)
+        assert rendered.count('value="Log in"') == 2
+        assert rendered.count('value="Sign up"') == 2
+        assert len(context.dicts) == dicts_len
+
+    # compiled templates are cached within nodes
+    assert calls.count('sitegate/signin/form_as_p.html') == 2
+    assert calls.count('sitegate/signup/form_as_p.html') == 2
+
+
+def test_flow_form_cached(request_get, user_create):
+    cache.clear()
+
+    template = Template('{% load sitegate %}{% sitegate_signin_form %}{% sitegate_signup_form cached %}')
+    view = signin_view(cache_forms=True)(signup_view(lambda req: req))
+
+    def render(token):
+        request = view(request_get('/entrance/', user=user_create(anonymous=True)))
+        rendered = template.render(Context({'request': request, 'csrf_token': token}))
+        return request, rendered
+
+    request, rendered = render('token1')
+    assert 'value="token1"' in rendered
+    assert 'Log in' in rendered
+    assert 'Sign up' in rendered
+
+    request, rendered = render('token2')
+    assert 'token1' not in rendered
+    assert rendered.count('value="token2"') == 4  # two forms and two remotes
+    assert 'Log in' in rendered
+    assert 'Sign up' in rendered
+
+    # forms are not constructed for cached HTML
+    assert request.sitegate['signin_forms']['ModernSignin']._wrapped is empty
+    assert request.sitegate['signup_forms']['ModernSignup']._wrapped is empty
+
+    # not cached for authenticated
+    request = view(request_get('/entrance/', user=user_create()))
+    template.render(Context({'request': request, 'csrf_token': 'token3'}))
+    assert request.sitegate['signin_forms']['ModernSignin']._wrapped is not empty
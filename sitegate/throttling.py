@@ -0,0 +1,131 @@
+from hashlib import md5
+from ipaddress import ip_network
+from time import time
+from typing import Dict, List, Tuple, Optional
+
+from django.core.cache import cache
+from django.http import HttpRequest
+
+from .utils import cache_incr
+
+
+def get_client_ip(request: HttpRequest) -> str:
+    """Returns client IP address for the given request.
+
+    .. note:: REMOTE_ADDR is used. If your project is behind a proxy
+        make sure it is set properly (e.g. by a middleware).
+
+    :param request:
+
+    """
+    return request.META.get('REMOTE_ADDR', '') or ''
+
+
+def get_subnet(ip: str) -> str:
+    """Returns a subnet for the given IP address: /24 for IPv4, /64 for IPv6.
+    Returns an empty string if address is invalid.
+
+    :param ip:
+
+    """
+    if not ip:
+        return ''
+
+    try:
+        return str(ip_network(f"{ip}/{64 if ':' in ip else 24}", strict=False))
+
+    except ValueError:
+        return ''
+
+
+class Throttle:
+    """Counts attempts within a sliding time window for a number of scopes
+    (e.g. IP address, subnet, username) using Django cache atomic increments.
+
+    Sliding window is approximated using counters of current and previous fixed windows:
+    previous counter is weighted by a part of the previous window overlapping the sliding one.
+
+    """
+    defaults: Dict[str, float] = {
+        'window': 300,  # Seconds. Counting window.
+    }
+
+    def __init__(self, name: str, **settings):
+        """
+        :param name: Throttle name to distinguish counters.
+
+        :param settings: Window and limits, e.g. {'window': 60, 'ip': 10, 'subnet': 50}.
+            Keys other than `window` are scopes, values are maximum attempts in a window.
+            Scopes with false limits are not throttled.
+
+        """
+        self.name = name
+        self.settings = {**self.defaults, **settings}
+
+    @property
+    def limits(self) -> Dict[str, int]:
+        """Scopes limits."""
+        return {scope: limit for scope, limit in self.settings.items() if scope != 'window' and limit}
+
+    def get_keys(self, values: Dict[str, str], *, now: float = None) -> List[Tuple[str, str, str]]:
+        """Returns (scope, current window key, previous window key) triples
+        for throttled scopes with non-empty values.
+
+        :param values: Scopes values, e.g. {'ip': '127.0.0.1'}.
+        :param now: Timestamp.
+
+        """
+        window_idx = int((now or time()) // self.settings['window'])
+        limits = self.limits
+        keys = []
+
+        for scope, value in values.items():
+
+            if not value or scope not in limits:
+                continue
+
+            prefix = f"sitegate_th_{self.name}_{scope}_{md5(f'{value}'.encode()).hexdigest()}"
+            keys.append((scope, f'{prefix}_{window_idx}', f'{prefix}_{window_idx - 1}'))
+
+        return keys
+
+    def is_exceeded(self, values: Dict[str, str], *, now: float = None) -> Optional[str]:
+        """Checks attempts counters. Returns the first scope
+        which limit is exceeded or None. Uses one cache request.
+
+        :param values: Scopes values, e.g. {'ip': '127.0.0.1'}.
+        :param now: Timestamp.
+
+        """
+        now = now or time()
+        keys = self.get_keys(values, now=now)
+
+        if not keys:
+            return None
+
+        window = self.settings['window']
+        counters = cache.get_many([key for _, *scope_keys in keys for key in scope_keys])
+
+        # Part of the previous window overlapping the sliding one.
+        weight = 1 - (now % window) / window
+        limits = self.limits
+
+        for scope, key_current, key_previous in keys:
+            count = counters.get(key_current, 0) + counters.get(key_previous, 0) * weight
+
+            if count >= limits[scope]:
+                return scope
+
+        return None
+
+    def register(self, values: Dict[str, str], *, now: float = None):
+        """Registers an attempt incrementing counters.
+
+        :param values: Scopes values, e.g. {'ip': '127.0.0.1'}.
+        :param now: Timestamp.
+
+        """
+        timeout = self.settings['window'] * 2
+
+        for _, key_current, _ in self.get_keys(values, now=now):
+            cache_incr(key_current, timeout)
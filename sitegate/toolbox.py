@@ -1,11 +1,11 @@
 from django.urls import re_path
 
 from .decorators import sitegate_view, signin_view, signup_view, redirect_signedin  # noqa
-from .views import verify_email, remote_auth, remote_auth_start
+from .views import verify_email, remote_auth, remote_auth_start, remote_auth_async, remote_auth_start_async
 from .utils import register_remotes  # noqa
 
 
-def get_sitegate_urls() -> list:
+def get_sitegate_urls(*, asynchronous: bool = False) -> list:
     """Returns sitegate urlpatterns, that can be attached
     to urlpatterns of a project:
 
@@ -19,10 +19,18 @@ def get_sitegate_urls() -> list:
             ...
         ) + get_sitegate_urls()  # Attach.
 
+    :param asynchronous: Use asynchronous views for remote auth (for ASGI).
+
     """
     urls = [
         re_path(r'^verify_email/(?P<code>\S+)/$', verify_email, name='verify_email'),
-        re_path(r'^rauth/(?P<alias>\S+)/start/$', remote_auth_start, name='remote_auth_start'),
-        re_path(r'^rauth/(?P<alias>\S+)/$', remote_auth, name='remote_auth'),
+        re_path(
+            r'^rauth/(?P<alias>\S+)/start/$',
+            remote_auth_start_async if asynchronous else remote_auth_start,
+            name='remote_auth_start'),
+        re_path(
+            r'^rauth/(?P<alias>\S+)/$',
+            remote_auth_async if asynchronous else remote_auth,
+            name='remote_auth'),
     ]
     return urls
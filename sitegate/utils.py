@@ -4,6 +4,7 @@ from functools import wraps
 from typing import Dict
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from etc.toolbox import import_project_modules
 
 from .settings import APP_MODULE_NAME
@@ -23,20 +24,50 @@ def available_attrs(fn):
     return WRAPPER_ASSIGNMENTS
 
 
+def cache_incr(key: str, timeout: float) -> int:
+    """Atomically increments a counter kept in Django cache. Returns a new value.
+
+    :param key: Cache key.
+    :param timeout: Seconds. Counter expiration time if it is created.
+
+    """
+    cache.add(key, 0, timeout)
+
+    try:
+        return cache.incr(key)
+
+    except ValueError:  # Expired in between.
+        cache.set(key, 1, timeout)
+        return 1
+
+
 def import_project_sitegate_modules():
     """Imports sitegates modules from registered apps."""
     return import_project_modules(APP_MODULE_NAME)
 
 
-def register_remotes(*remotes: 'Remote'):
+def register_remotes(*remotes: 'Remote', http: dict = None, breaker: dict = None):
     """Registers (configures) remotes.
 
     :param remotes: Remote heirs instances.
 
+    :param http: HTTP settings to apply to all the given remotes,
+        e.g. {'pool_size': 20, 'retries': 3}. See `Remote.http_defaults`.
+
+    :param breaker: Circuit breaker settings to apply to all the given remotes,
+        e.g. {'failure_rate': 0.3, 'open_for': 60}. See `CircuitBreaker.defaults`.
+
     """
     global _REMOTES_REGISTRY
 
     for remote in remotes:
+
+        if http:
+            remote.configure_http(**http)
+
+        if breaker:
+            remote.configure_breaker(**breaker)
+
         _REMOTES_REGISTRY[remote.alias] = remote
 
 
@@ -55,15 +86,30 @@ class DecoratorBuilder:
         """Accepts decoration function arguments."""
         self._args_dec = list(args)
         self._kwargs_dec = dict(kwargs)
+        self._decorated = None
+
+        if len(self._args_dec) and hasattr(self._args_dec[0], '__call__'):
+            # Case two: @dec. This builder object stands for a decorated function.
+            self.contribute(self, self._args_dec[0])
 
     def handle(self, func, args_func, kwargs_func, args_dec, kwargs_dec):
         raise NotImplementedError  # pragma: nocover
 
+    def contribute(self, target, func):
+        """Allows contributing to a decorated function (e.g. set attributes).
+        Called once on decoration.
+
+        :param target: Decorated function.
+        :param func: Function being decorated.
+
+        """
+
     def __call__(self, *args_call, **kwargs_call):
         def decorated(view_function):
             @wraps(view_function, assigned=available_attrs(view_function))
             def catcher(*args_func, **kwargs_func):
                 return self.handle(view_function, args_func, kwargs_func, self._args_dec, self._kwargs_dec)
+            self.contribute(catcher, view_function)
             return catcher
 
         # Case one: @dec('a', b='b')
@@ -72,6 +118,8 @@ class DecoratorBuilder:
 
         # Case two: @dec
         if len(self._args_dec) and hasattr(self._args_dec[0], '__call__'):
-            return decorated(self._args_dec[0])(*args_call, **kwargs_call)
+            if self._decorated is None:
+                self._decorated = decorated(self._args_dec[0])
+            return self._decorated(*args_call, **kwargs_call)
 
         return decorated
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from django.contrib import messages
 from django.http import HttpRequest, HttpResponse, HttpResponseBadRequest, HttpResponseNotAllowed
 from django.shortcuts import redirect
@@ -7,6 +9,9 @@ from .models import EmailConfirmation, RemoteRecord
 from .settings import SIGNUP_VERIFY_EMAIL_ERROR_TEXT, SIGNUP_VERIFY_EMAIL_SUCCESS_TEXT
 from .utils import get_registered_remotes
 
+if False:  # pragma: nocover
+    from .signin_flows.remotes.base import Remote, UserData  # noqa
+
 
 def verify_email(request: HttpRequest, code: str, redirect_to: str = None) -> HttpResponse:
     """Verifies an account activation code a user received by e-mail.
@@ -18,12 +23,12 @@ def verify_email(request: HttpRequest, code: str, redirect_to: str = None) -> Ht
     :param redirect_to:
 
     """
-    success = False
+    if ':' in code:
+        # Stateless signed token.
+        success = EmailConfirmation.activate_token(code)
 
-    valid_code = EmailConfirmation.is_valid(code)
-    if valid_code:
-        valid_code.activate()
-        success = True
+    else:
+        success = EmailConfirmation.activate_code(code)
 
     if success:
         messages.success(request, SIGNUP_VERIFY_EMAIL_SUCCESS_TEXT, 'success')
@@ -36,6 +41,87 @@ def verify_email(request: HttpRequest, code: str, redirect_to: str = None) -> Ht
     return redirect(redirect_to)
 
 
+def _remote_auth_get_record(request: HttpRequest, *, remote: 'Remote', code: str) -> Optional[RemoteRecord]:
+    """Returns a remote record for the given code if it is bound to the request user.
+
+    For a signed ticket (see `Remote.stateless`) a new unsaved record is returned.
+
+    :param request:
+    :param remote:
+    :param code:
+
+    """
+    alias = remote.alias
+
+    if ':' in code:
+        # Signed ticket. A record will be written only if auth is finished.
+        if not remote.check_ticket(request, code):
+            return None
+
+        request_user = request.user
+
+        return RemoteRecord(
+            remote=alias,
+            user=None if request_user.is_anonymous else request_user,
+            code=RemoteRecord.generate_code(),
+        )
+
+    if not RemoteRecord.is_code_well_formed(code):
+        return None
+
+    remote_record = RemoteRecord.objects.filter(
+        code=code,
+        remote=alias,
+    ).select_related('user').first()
+
+    if not remote_record:
+        return None
+
+    request_user = request.user
+    request_user = None if request_user.is_anonymous else request_user
+
+    if remote_record.user != request_user:
+        # in case someone tries to mess with us
+        return None
+
+    return remote_record
+
+
+def _remote_auth_finish(
+        request: HttpRequest,
+        *,
+        remote: 'Remote',
+        remote_record: RemoteRecord,
+        user_data: 'UserData'
+) -> HttpResponse:
+    """Finishes remote auth using previous records for remote_id if any.
+
+    :param request:
+    :param remote:
+    :param remote_record:
+    :param user_data:
+
+    """
+    user = remote_record.user
+
+    # try to find previous records for this remote_id
+    previous_record = RemoteRecord.objects.filter(
+        remote=remote.alias,
+        remote_id=user_data.remote_id,
+    ).select_related('user').first()
+
+    if previous_record:
+        user = previous_record.user
+        remote_record = previous_record
+
+    return remote.auth_finish(
+        request,
+        user_data=user_data,
+        remote_record=remote_record,
+        user=user,
+    )
+
+
 @requires_csrf_token
 def remote_auth(request: HttpRequest, alias: str) -> HttpResponse:
     """Performs an authorization using data from a remote.
@@ -58,45 +144,58 @@ def remote_auth(request: HttpRequest, alias: str) -> HttpResponse:
         if not code:
             return remote.redirect()
 
-        manager = RemoteRecord.objects
-
-        remote_record = manager.filter(
-            code=code,
-            remote=alias,
-        ).select_related('user').first()
+        remote_record = _remote_auth_get_record(request, remote=remote, code=code)
 
         if not remote_record:
             return remote.redirect()
 
-        user = remote_record.user
-        request_user = request.user
-        request_user = None if request_user.is_anonymous else request_user
+        user_data = remote.get_user_data(request, data=data)
 
-        if user != request_user:
-            # in case someone tries to mess with us
+        if not user_data:
             return remote.redirect()
 
-        user_data = remote.get_user_data(request, data=data)
+        return _remote_auth_finish(request, remote=remote, remote_record=remote_record, user_data=user_data)
+
+    # this is GET
+    return remote.auth_continue(request)
+
+
+async def remote_auth_async(request: HttpRequest, alias: str) -> HttpResponse:
+    """Performs an authorization using data from a remote. Asynchronous variant.
+
+    Waits for a remote without occupying a thread.
+    Requires CSRF middleware to be active.
+
+    :param request:
+    :param alias: remote service alias
+
+    """
+    from asgiref.sync import sync_to_async
+
+    remote = get_registered_remotes().get(alias)
+
+    if not remote:
+        return HttpResponseBadRequest()
+
+    if request.method == 'POST':
+        data = request.POST.dict()
+        code = remote.get_code_from_data(data)
+
+        if not code:
+            return remote.redirect()
+
+        remote_record = await sync_to_async(_remote_auth_get_record)(request, remote=remote, code=code)
+
+        if not remote_record:
+            return remote.redirect()
+
+        user_data = await remote.aget_user_data(request, data=data)
 
         if not user_data:
             return remote.redirect()
 
-        # try to find previous records for this remote_id
-        previous_record = manager.filter(
-            remote=alias,
-            remote_id=user_data.remote_id,
-        ).select_related('user').first()
-
-        if previous_record:
-            user = previous_record.user
-            remote_record = previous_record
-
-        return remote.auth_finish(
-            request,
-            user_data=user_data,
-            remote_record=remote_record,
-            user=user,
-        )
+        return await sync_to_async(_remote_auth_finish)(
+            request, remote=remote, remote_record=remote_record, user_data=user_data)
 
     # this is GET
     return remote.auth_continue(request)
@@ -127,6 +226,9 @@ def remote_auth_start(request: HttpRequest, alias: str) -> HttpResponse:
             # local user profile is already signe in and linked to this remote
             return remote.redirect()
 
+    if remote.stateless:
+        return remote.auth_start_signed(request, user=user)
+
     # create a record bound to an unregistered or unlinked user
     record = RemoteRecord.add(
         remote=alias,
@@ -134,3 +236,14 @@ def remote_auth_start(request: HttpRequest, alias: str) -> HttpResponse:
     )
 
     return remote.auth_start(request, ticket=record.code)
+
+
+async def remote_auth_start_async(request: HttpRequest, alias: str) -> HttpResponse:
+    """Performs a redirect to another service for remote auth. Asynchronous variant.
+
+    :param request:
+    :param alias: remote service alias
+
+    """
+    from asgiref.sync import sync_to_async
+    return await sync_to_async(remote_auth_start)(request, alias)